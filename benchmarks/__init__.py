@@ -0,0 +1 @@
+""" Benchmarks for zoot, run them as modules, e.g `python -m benchmarks.collect`."""
@@ -0,0 +1,63 @@
+""" Compare the full and the pruned traversal of DecoCollector.
+
+    $ python -m benchmarks.collect [--repeat N] [files ...]
+
+Files are parsed once, only the visit is timed. Defaults to a couple of large test
+files of the stdlib of the running interpreter.
+"""
+import argparse
+import io
+import sysconfig
+import time
+from contextlib import redirect_stderr
+from pathlib import Path
+from typing import List
+
+import libcst
+
+from zoot.annotate import DecoCollector
+
+STDLIB_TEST = Path(sysconfig.get_paths()["stdlib"]) / "test"
+DEFAULT_FILES = ["test_unicode.py", "test_str.py", "test_descr.py", "test_os.py"]
+
+argparser = argparse.ArgumentParser(prog="benchmarks.collect", description=__doc__)
+argparser.add_argument("files", nargs="*", help="Test files to visit.")
+argparser.add_argument(
+    "--repeat", type=int, default=5, help="Best of N runs. Default '%(default)s'."
+)
+
+
+def best_of(module: libcst.Module, prune: bool, repeat: int) -> float:
+    """Best time out of repeat visits of module."""
+    timings = []
+    for _ in range(repeat):
+        collect = DecoCollector(prune=prune)
+        start = time.perf_counter()
+        with redirect_stderr(io.StringIO()):
+            module.visit(collect)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(files: List[str], repeat: int) -> None:
+    paths = [Path(f) for f in files] or [
+        STDLIB_TEST / name for name in DEFAULT_FILES if (STDLIB_TEST / name).exists()
+    ]
+    print(
+        f"{'file':<24} {'lines':>7} {'full (s)':>10} {'pruned (s)':>10}"
+        f" {'speedup':>8}"
+    )
+    for path in paths:
+        source = path.read_text(encoding="utf-8")
+        module = libcst.parse_module(source)
+        full = best_of(module, False, repeat)
+        pruned = best_of(module, True, repeat)
+        print(
+            f"{path.name:<24} {source.count(chr(10)):>7} {full:>10.4f}"
+            f" {pruned:>10.4f} {full / pruned:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+    main(args.files, args.repeat)
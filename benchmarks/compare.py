@@ -0,0 +1,153 @@
+""" Compare the throughput of the collectors and annotators against a baseline.
+
+    $ python -m benchmarks.compare --save baseline.json
+    $ python -m benchmarks.compare baseline.json [--threshold 0.1]
+
+Every benchmark is run repeatedly, throughput (lines/s) is summarized by its
+median and interquartile range. A benchmark regresses when its median drops by
+more than the threshold and its upper quartile is below the lower quartile of the
+baseline, so a noisy run alone doesn't fail the comparison. Exits with 1 if any
+benchmark regressed.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from benchmarks.corpus import Config, add_config_args, config_from_args
+from benchmarks.suite import Result, bench_annotate, bench_collect, corpus
+
+# Bump this whenever the format of the baseline changes.
+BASELINE_VERSION = 1
+THRESHOLD = 0.1
+
+
+def stats(result: Result) -> Dict[str, Any]:
+    """Median and quartiles of the throughput of every run, in lines/s."""
+    rates = sorted(result.lines / t for t in result.timings)
+    if len(rates) > 1:
+        q1, _, q3 = statistics.quantiles(rates, n=4, method="inclusive")
+    else:
+        q1 = q3 = rates[0]
+    return {
+        "median": statistics.median(rates),
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "runs": rates,
+    }
+
+
+def run(config: Config, files: int, repeat: int) -> Dict[str, Any]:
+    modules = corpus(config, files)
+    results = bench_collect(modules, repeat) + bench_annotate(modules, repeat)
+    return {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "libcst": version("libcst"),
+        "config": config._asdict(),
+        "files": files,
+        "benchmarks": {result.name: stats(result) for result in results},
+    }
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> Tuple[List[Tuple[str, float, float, float, bool]], bool]:
+    """Rows of (name, baseline median, current median, delta, regressed) for the
+    benchmarks in both, and whether any regressed.
+    """
+    rows = []
+    for name, new in current["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            continue
+        delta = (new["median"] - old["median"]) / old["median"]
+        regressed = delta < -threshold and new["q3"] < old["q1"]
+        rows.append((name, old["median"], new["median"], delta, regressed))
+    return rows, any(row[-1] for row in rows)
+
+
+def table(
+    rows: Sequence[Tuple[str, float, float, float, bool]], current: Dict[str, Any]
+) -> List[str]:
+    lines = [
+        f"{'benchmark':<18} {'baseline':>11} {'current':>11} {'iqr':>9}"
+        f" {'delta':>8}"
+    ]
+    for name, old, new, delta, regressed in rows:
+        iqr = current["benchmarks"][name]["iqr"]
+        mark = "  REGRESSED" if regressed else ""
+        lines.append(
+            f"{name:<18} {old:>11.0f} {new:>11.0f} {iqr:>9.0f} {delta:>+8.1%}{mark}"
+        )
+    return lines
+
+
+argparser = argparse.ArgumentParser(prog="benchmarks.compare", description=__doc__)
+argparser.add_argument("baseline", nargs="?", help="Baseline to compare against.")
+argparser.add_argument("--save", help="Write the results as a baseline to this file.")
+argparser.add_argument(
+    "--threshold",
+    type=float,
+    default=THRESHOLD,
+    help="Largest drop in throughput allowed, as a fraction. Default '%(default)s'.",
+)
+argparser.add_argument(
+    "--files", type=int, default=5, help="Number of files. Default '%(default)s'."
+)
+argparser.add_argument(
+    "--repeat",
+    type=int,
+    default=7,
+    help="Runs of each benchmark. Default '%(default)s'.",
+)
+add_config_args(argparser)
+
+
+def main(args: argparse.Namespace) -> int:
+    if not args.baseline and not args.save:
+        argparser.error("Either pass a baseline to compare against or '--save'")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("version") != BASELINE_VERSION:
+            print(
+                f"[ERROR]: '{args.baseline}' is not a version {BASELINE_VERSION}"
+                " baseline, save a new one.",
+                file=sys.stderr,
+            )
+            return 2
+        # compare like with like, the corpus is part of the baseline.
+        args.files = baseline["files"]
+        config = Config(**baseline["config"])
+    else:
+        config = config_from_args(args)
+    current = run(config, args.files, args.repeat)
+    if args.save:
+        with open(Path(args.save), "w") as f:
+            json.dump(current, f, indent=2)
+            f.write("\n")
+        print(f"Wrote baseline to '{args.save}'.")
+    if baseline is None:
+        return 0
+    print(
+        f"Throughput in lines/s, baseline: python {baseline['python']}, libcst"
+        f" {baseline['libcst']}, current: python {current['python']}, libcst"
+        f" {current['libcst']}."
+    )
+    rows, regressed = compare(baseline, current, args.threshold)
+    for line in table(rows, current):
+        print(line)
+    if regressed:
+        print(f"Throughput dropped by more than {args.threshold:.0%}.")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(argparser.parse_args()))
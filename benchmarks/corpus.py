@@ -0,0 +1,161 @@
+""" Generate synthetic test modules, a CPython version and a RustPython version
+holding markers, standing in for the test files of the stdlib.
+
+    $ python -m benchmarks.corpus OUT [--files N] [--classes N] [--methods N]
+        [--density D] [--body N] [--seed S]
+
+Writes OUT/cpython/Lib/test and OUT/rustpython/pylib/Lib/test. Sizes scale with
+classes * methods * body, e.g. 100 classes of 50 methods with a body of 15 lines
+give files of about 100k lines.
+"""
+import argparse
+import random
+from pathlib import Path
+from typing import List, NamedTuple
+
+# Markers put in the RustPython version, the forms found in RustPython's tests.
+FUNC_MARKERS = [
+    "{i}# TODO: RUSTPYTHON\n{i}@unittest.expectedFailure\n",
+    '{i}@unittest.skip("TODO: RUSTPYTHON")\n',
+    '{i}@unittest.skip(\n{i}    "TODO: RUSTPYTHON, needs a fix"\n{i})\n',
+    "{i}# TODO: RUSTPYTHON\n{i}@unittest.expectedFailure  # flaky\n",
+]
+CLASS_MARKER = '@unittest.skip("TODO: RUSTPYTHON")\n'
+# Statements bodies are made of, indented by 8 spaces.
+STATEMENTS = [
+    "x = {n} * 2",
+    "self.assertEqual(x, {n} * 2)",
+    "values = [i for i in range({n}) if i % 3]",
+    "self.assertIn({n}, range({n} + 1))",
+    "# a regular comment about case {n}\n        x = {n}",
+    "with self.assertRaises(ValueError):\n            int('x{n}')",
+    "if x > {n}:\n            self.fail('too large')",
+    "self.assertTrue(isinstance(values, list), msg='case {n}')",
+]
+
+
+class Config(NamedTuple):
+    """The shape of the generated modules."""
+
+    classes: int = 10
+    methods: int = 20
+    # Fraction of the methods marked in RustPython, a tenth of that for classes.
+    density: float = 0.2
+    # Lines of statements in the body of every method.
+    body: int = 8
+
+
+class Module(NamedTuple):
+    cpython: str
+    rustpython: str
+    lines: int
+    # Number of functions and classes marked in the RustPython version.
+    marked: int
+
+
+def generate(config: Config, seed: int = 0) -> Module:
+    """Generate a module, the CPython version has a test the RustPython version
+    doesn't, so syncing them changes something.
+    """
+    rnd = random.Random(seed)
+    header = f'""" Synthetic test module {seed}. """\nimport unittest\n'
+    header += "from test import support\n\n"
+    cpython: List[str] = [header]
+    rustpython: List[str] = [header]
+    marked = 0
+    for c in range(config.classes):
+        marker = ""
+        if rnd.random() < config.density / 10:
+            marker = CLASS_MARKER
+            marked += 1
+        head = f"class Test{seed}_{c}(unittest.TestCase):\n"
+        cpython.append("\n" + head)
+        rustpython.append("\n" + marker + head)
+        for m in range(config.methods):
+            method = _method(rnd, f"test_{m}", config.body)
+            cpython.append(method)
+            if rnd.random() < config.density:
+                form = FUNC_MARKERS[rnd.randrange(len(FUNC_MARKERS))]
+                # methods start with a blank line, markers go after it.
+                method = "\n" + form.format(i="    ") + method[1:]
+                marked += 1
+            rustpython.append(method)
+    cpython.append(_method(rnd, "test_new", config.body))
+    cpython.append("\n\nif __name__ == '__main__':\n    unittest.main()\n")
+    rustpython.append("\n\nif __name__ == '__main__':\n    unittest.main()\n")
+    source = "".join(cpython)
+    return Module(source, "".join(rustpython), source.count("\n"), marked)
+
+
+def _method(rnd: random.Random, name: str, body: int) -> str:
+    lines = [f"\n    def {name}(self):\n"]
+    for n in range(body):
+        statement = STATEMENTS[rnd.randrange(len(STATEMENTS))]
+        lines.append(f"        {statement.format(n=n)}\n")
+    return "".join(lines)
+
+
+def write(out: Path, files: int, config: Config, seed: int = 0) -> List[Module]:
+    """Write a corpus of files, like the test directories of both repositories."""
+    cpython = out / "cpython" / "Lib" / "test"
+    rustpython = out / "rustpython" / "pylib" / "Lib" / "test"
+    cpython.mkdir(parents=True, exist_ok=True)
+    rustpython.mkdir(parents=True, exist_ok=True)
+    modules = []
+    for i in range(files):
+        module = generate(config, seed + i)
+        (cpython / f"test_synthetic_{i}.py").write_text(module.cpython)
+        (rustpython / f"test_synthetic_{i}.py").write_text(module.rustpython)
+        modules.append(module)
+    return modules
+
+
+def add_config_args(parser: argparse.ArgumentParser) -> None:
+    """Add the options of Config to a parser."""
+    defaults = Config()
+    parser.add_argument(
+        "--classes",
+        type=int,
+        default=defaults.classes,
+        help="Test classes per file. Default '%(default)s'.",
+    )
+    parser.add_argument(
+        "--methods",
+        type=int,
+        default=defaults.methods,
+        help="Test methods per class. Default '%(default)s'.",
+    )
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=defaults.density,
+        help="Fraction of the methods marked in RustPython. Default '%(default)s'.",
+    )
+    parser.add_argument(
+        "--body",
+        type=int,
+        default=defaults.body,
+        help="Lines in the body of a method. Default '%(default)s'.",
+    )
+
+
+def config_from_args(args: argparse.Namespace) -> Config:
+    return Config(args.classes, args.methods, args.density, args.body)
+
+
+argparser = argparse.ArgumentParser(prog="benchmarks.corpus", description=__doc__)
+argparser.add_argument("out", help="Directory to write the corpus to.")
+argparser.add_argument(
+    "--files", type=int, default=10, help="Number of files. Default '%(default)s'."
+)
+argparser.add_argument(
+    "--seed", type=int, default=0, help="Seed of the first file. Default '%(default)s'."
+)
+add_config_args(argparser)
+
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+    modules = write(Path(args.out), args.files, config_from_args(args), args.seed)
+    lines = sum(module.lines for module in modules)
+    print(f"Wrote {len(modules)} files, {lines} lines to '{args.out}'.")
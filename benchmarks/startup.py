@@ -0,0 +1,111 @@
+""" Startup time of the command line, from the import times Python reports.
+
+    $ python -m benchmarks.startup [--repeat N] [--top N] [--max-ms MS]
+        [-- ARGS...]
+
+Runs `python -X importtime -m zoot ARGS` (by default `--help`), reports the
+import time and the modules that took longest to import. Exits with 1 if any of
+the heavy modules, only needed once files are parsed, got imported or the
+import time went over --max-ms.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import List, NamedTuple, Sequence
+
+# Imported only once a file needs parsing, never by argument handling.
+HEAVY = ["libcst"]
+
+
+class Import(NamedTuple):
+    name: str
+    # Microseconds, the module alone and including what it imports.
+    self: int
+    cumulative: int
+
+
+def imports(args: Sequence[str]) -> List[Import]:
+    """Modules imported running zoot with args, in the order they finished."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "zoot", *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    result = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if not fields[0].strip().isdigit():
+            # the header.
+            continue
+        result.append(Import(fields[2].strip(), int(fields[0]), int(fields[1])))
+    return result
+
+
+def total(modules: Sequence[Import]) -> int:
+    """Time spent importing, in microseconds."""
+    return sum(module.self for module in modules)
+
+
+def heavy(modules: Sequence[Import]) -> List[str]:
+    """The heavy modules, or any of their submodules, that were imported."""
+    names = {module.name for module in modules}
+    return [
+        name
+        for name in HEAVY
+        if name in names or any(n.startswith(name + ".") for n in names)
+    ]
+
+
+def slowest(modules: Sequence[Import], top: int) -> List[Import]:
+    # only the modules imported by zoot and the top level ones.
+    roots = [m for m in modules if m.name.startswith("zoot") or "." not in m.name]
+    return sorted(roots, key=lambda m: m.cumulative, reverse=True)[:top]
+
+
+argparser = argparse.ArgumentParser(prog="benchmarks.startup", description=__doc__)
+argparser.add_argument(
+    "--repeat",
+    type=int,
+    default=5,
+    help="Runs to take the median of. Default '%(default)s'.",
+)
+argparser.add_argument(
+    "--top", type=int, default=10, help="Slowest imports shown. Default '%(default)s'."
+)
+argparser.add_argument(
+    "--max-ms", type=float, help="Fail if importing takes longer than this."
+)
+argparser.add_argument(
+    "args", nargs="*", default=["--help"], help="Arguments passed to zoot."
+)
+
+
+def main(args: argparse.Namespace) -> int:
+    runs = [imports(args.args) for _ in range(args.repeat)]
+    elapsed = statistics.median(total(run) for run in runs) / 1000
+    # the last run, the others differ only in timings.
+    modules = runs[-1]
+    print(f"Imported {len(modules)} modules in {elapsed:.1f}ms (median).")
+    print(f"{'module':<40} {'self (ms)':>10} {'cumulative (ms)':>16}")
+    for module in slowest(modules, args.top):
+        print(
+            f"{module.name:<40} {module.self / 1000:>10.1f}"
+            f" {module.cumulative / 1000:>16.1f}"
+        )
+    failed = False
+    found = heavy(modules)
+    if found:
+        print(f"Imported at startup: {', '.join(found)}.")
+        failed = True
+    if args.max_ms is not None and elapsed > args.max_ms:
+        print(f"Importing took longer than {args.max_ms}ms.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(argparser.parse_args()))
@@ -0,0 +1,217 @@
+""" Throughput of the collectors, the annotators and a whole sync, over a
+synthetic corpus (see benchmarks.corpus).
+
+    $ python -m benchmarks.suite [--files N] [--repeat N] [--jobs N] [--no-driver]
+        [--classes N] [--methods N] [--density D] [--body N]
+
+The end to end benchmark runs Driver against scratch git repositories, standing
+in for CPython and RustPython, created in a temporary directory for every run.
+"""
+import argparse
+import io
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Sequence
+
+import libcst
+
+from benchmarks.corpus import (
+    Config,
+    Module,
+    add_config_args,
+    config_from_args,
+    generate,
+    write,
+)
+from zoot.annotate import DecoAnnotator, DecoCollector
+from zoot.scan import ScanCollector
+from zoot.splice import SpliceAnnotator
+
+
+class Result(NamedTuple):
+    name: str
+    # Seconds taken by every run.
+    timings: List[float]
+    files: int
+    lines: int
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.timings)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.median
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / self.median
+
+
+def corpus(config: Config, files: int) -> List[Module]:
+    return [generate(config, seed) for seed in range(files)]
+
+
+def _timed(fn: Callable[[], None], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # the collectors warn about stray comments.
+        with redirect_stderr(io.StringIO()):
+            fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _result(name: str, modules: Sequence[Module], timings: List[float]) -> Result:
+    return Result(name, timings, len(modules), sum(m.lines for m in modules))
+
+
+def bench_collect(modules: Sequence[Module], repeat: int) -> List[Result]:
+    """Collecting the markers of the RustPython files, parse included."""
+    results = []
+    for name, collector in [
+        ("collect-libcst", lambda: DecoCollector(prune=True)),
+        ("collect-scan", lambda: ScanCollector()),
+    ]:
+
+        def run() -> None:
+            for module in modules:
+                collector().collect(module.rustpython)
+
+        results.append(_result(name, modules, _timed(run, repeat)))
+    return results
+
+
+def bench_annotate(modules: Sequence[Module], repeat: int) -> List[Result]:
+    """Applying the markers to the CPython files, parse and codegen included."""
+    collectors = []
+    with redirect_stderr(io.StringIO()):
+        for module in modules:
+            collect = DecoCollector(prune=True)
+            collect.collect(module.rustpython)
+            collectors.append(collect)
+    results = []
+    for name, annotate in [
+        (
+            "annotate-libcst",
+            lambda collect, source: libcst.parse_module(source)
+            .visit(DecoAnnotator.from_collector(collect))
+            .code,
+        ),
+        (
+            "annotate-splice",
+            lambda collect, source: SpliceAnnotator.from_collector(collect).annotate(
+                source
+            ),
+        ),
+    ]:
+
+        def run() -> None:
+            for module, collect in zip(modules, collectors):
+                annotate(collect, module.cpython)
+
+        results.append(_result(name, modules, _timed(run, repeat)))
+    return results
+
+
+def _git(path: Path, *args: str) -> None:
+    subprocess.check_output(["git", *args], cwd=path)
+
+
+def scratch_repos(root: Path, config: Config, files: int) -> List[Module]:
+    """Create a CPython and a RustPython repository holding the corpus."""
+    modules = write(root, files, config)
+    for repo, branch in [("cpython", "3.11"), ("rustpython", "main")]:
+        _git(root / repo, "init", "-q", "-b", branch)
+        _git(root / repo, "config", "user.name", "zoot")
+        _git(root / repo, "config", "user.email", "zoot@example.com")
+        _git(root / repo, "add", "-A")
+        _git(root / repo, "commit", "-q", "-m", "init")
+    return modules
+
+
+def bench_driver(
+    config: Config, files: int, repeat: int, jobs: int, options: Sequence[str] = ()
+) -> Result:
+    """A whole sync, writing files and committing them included."""
+    # imported here, zoot.__main__ is a script.
+    from zoot.__main__ import argparser
+    from zoot.drive import Driver
+
+    timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            modules = scratch_repos(root, config, files)
+            args = argparser.parse_args(
+                [
+                    "--cpython",
+                    str(root / "cpython"),
+                    "--rustpython",
+                    str(root / "rustpython"),
+                    "--all",
+                    "--no-cache",
+                    "--jobs",
+                    str(jobs),
+                    *options,
+                ]
+            )
+            driver = Driver(args)
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                driver.run()
+            timings.append(time.perf_counter() - start)
+    return _result("driver", modules, timings)
+
+
+def report(results: Sequence[Result]) -> None:
+    print(
+        f"{'benchmark':<18} {'files':>6} {'lines':>9} {'median (s)':>11}"
+        f" {'files/s':>9} {'lines/s':>11}"
+    )
+    for r in results:
+        print(
+            f"{r.name:<18} {r.files:>6} {r.lines:>9} {r.median:>11.4f}"
+            f" {r.files_per_second:>9.2f} {r.lines_per_second:>11.0f}"
+        )
+
+
+argparser = argparse.ArgumentParser(prog="benchmarks.suite", description=__doc__)
+argparser.add_argument(
+    "--files", type=int, default=10, help="Number of files. Default '%(default)s'."
+)
+argparser.add_argument(
+    "--repeat",
+    type=int,
+    default=3,
+    help="Runs of each benchmark. Default '%(default)s'.",
+)
+argparser.add_argument(
+    "--jobs",
+    type=int,
+    default=1,
+    help="Jobs used by the end to end benchmark. Default '%(default)s'.",
+)
+argparser.add_argument(
+    "--no-driver", action="store_true", help="Skip the end to end benchmark."
+)
+add_config_args(argparser)
+
+
+def main(args: argparse.Namespace) -> None:
+    config = config_from_args(args)
+    modules = corpus(config, args.files)
+    results = bench_collect(modules, args.repeat)
+    results += bench_annotate(modules, args.repeat)
+    if not args.no_driver:
+        results.append(bench_driver(config, args.files, args.repeat, args.jobs))
+    report(results)
+
+
+if __name__ == "__main__":
+    main(argparser.parse_args())
@@ -2,12 +2,18 @@
 import argparse
 import sys
 import os
+import shutil
 from pathlib import Path
-from zoot.helpers import cpython_branch, git_exists
-from zoot.drive import Driver
+from typing import Type
+from zoot.helpers import cpython_branch, git_exists, git_resolve
+from zoot.drive import MEMORY_BUDGET, Driver
+from zoot.cache import CACHE_DIR, CACHE_SIZE
+from zoot.execute import TIMEOUT
 
 CPYTHON = Path.home() / "Devel/cpython"
 RUSTPYTHON = Path.home() / "Devel/RustPython"
+# Relative to RustPython, where `cargo build --release` puts the binary.
+RUSTPYTHON_BINARY = Path("target/release/rustpython")
 MIN_BRANCH = "3.10"
 MAIN_BRANCH = "3.12"  # TODO: Make this dynamic.
 ZOOT_DESC = """
@@ -18,16 +24,27 @@ For test files, `unittest.skip` and `unittest.expectedFailure`, decorators that
 annotate test methods that fail, are grabbed from the files in RustPython and
 copied over to the CPython files from the target branch. This is done to ensure 
 that the tests are still marked as failing in the target branch. Directory structured
-tests, like `test_json` or `test_importlib` are not handled. If any unexpected
-mentions of `RUSTPYTHON` are found in a comment not preceding a decorator, a warning
-is printed.
+tests, like `test_json` or `test_importlib`, are walked recursively, every module is
+annotated on its own and the package is committed as a whole, files no longer in
+the CPython package are removed. If any unexpected mentions of `RUSTPYTHON` are
+found in a comment not preceding a decorator, a warning is printed. Test files in
+RustPython that don't mention `RUSTPYTHON` at all are replaced by a byte for byte
+copy of the CPython file, without parsing either. The CPython commit each file was
+synced from is recorded in `Lib/.zoot_sync.json` of RustPython, `--incremental`
+uses it to skip files that haven't changed since.
 
-If the `--copy-libs` files is passed, simple library files are copied 
+If the `--copy-libs` files is passed, library files and packages are copied 
 over from CPython to RustPython, no changes are made to the library files themselves.
 Libraries are located by stripping the `test_` prefix from the supplied names and
-looking for the files in the `Lib` directory of CPython. If one is found, the library
-gets copied, otherwise a warning is printed. A library file is considered simple if
-it is a single Python file, i.e not a directory.
+looking for the files in the `Lib` directory of CPython, underscores may stand for a
+package separator (`test_http_cookies` -> `http/cookies.py`) and `--lib-map` can
+map names that don't follow these rules. If one is found, the library
+gets copied byte for byte, skipping files that are already the same and removing
+those no longer in the CPython package, otherwise a warning is printed.
+
+If `--execute` is passed, the test files changed are run with the RustPython binary
+after syncing, `--jobs` at a time, and the tests failing (or marked as failing but
+passing) are reported along with any module that crashed or timed out.
 """
 
 argparser = argparse.ArgumentParser(
@@ -55,11 +72,31 @@ argparser.add_argument(
     default="3.11",
     type=str,
 )
+argparser.add_argument(
+    "--ref",
+    help=(
+        "Read CPython files from this ref (branch, tag or commit) through git"
+        " instead of the checked out tree, which can then be on any branch."
+        " '--branch' is still used in commit messages. Default '%(default)s'."
+    ),
+    default=None,
+    type=str,
+)
 argparser.add_argument(
     "filenames",
     help="Names of the test files (test_string, test_binop)",
     type=str,
-    nargs="+",
+    nargs="*",
+)
+argparser.add_argument(
+    "--all",
+    help=(
+        "Sync every test file present in both CPython and RustPython, largest"
+        " first. Files present in only one of them are reported."
+        " Default '%(default)s'."
+    ),
+    action="store_true",
+    default=False,
 )
 argparser.add_argument(
     "--copy-libs",
@@ -67,6 +104,159 @@ argparser.add_argument(
     action="store_true",
     default=True,
 )
+argparser.add_argument(
+    "--lib-map",
+    help=(
+        "JSON file mapping test names to the library they cover, relative to Lib,"
+        ' e.g. {"test_urllib2": "urllib/request.py"}. null means no library.'
+        " Extends the default mapping. Default '%(default)s'."
+    ),
+    default=None,
+    type=str,
+)
+argparser.add_argument(
+    "-j",
+    "--jobs",
+    help=(
+        "Number of worker processes used to parse and annotate test files. Git"
+        " operations are always performed in order. Default '%(default)s'."
+    ),
+    default=1,
+    type=int,
+)
+argparser.add_argument(
+    "--async",
+    help=(
+        "Use the asyncio driver, overlapping reading files and running git with"
+        " parsing and annotating in worker processes. Default '%(default)s'."
+    ),
+    dest="use_async",
+    action="store_true",
+    default=False,
+)
+argparser.add_argument(
+    "--memory-budget",
+    help=(
+        "Memory, in MiB, the files being collected and annotated in parallel may"
+        " take up. Files are handed to the workers only while the memory they are"
+        " estimated to need fits, at least one always is. Default '%(default)s'."
+    ),
+    default=MEMORY_BUDGET,
+    type=int,
+)
+argparser.add_argument(
+    "--collector",
+    help=(
+        "Backend used to collect annotations from RustPython files, 'scan' uses"
+        " ast/tokenize and falls back to libcst for ambiguous constructs."
+        " Default '%(default)s'."
+    ),
+    choices=["libcst", "scan"],
+    default="libcst",
+)
+argparser.add_argument(
+    "--annotator",
+    help=(
+        "Engine used to apply annotations to CPython files, 'splice' inserts lines"
+        " into the source instead of regenerating the module with libcst, output"
+        " is the same. Default '%(default)s'."
+    ),
+    choices=["libcst", "splice"],
+    default="libcst",
+)
+argparser.add_argument(
+    "--cache-dir",
+    help=(
+        "Directory holding the annotations collected from RustPython files."
+        " Default '%(default)s'."
+    ),
+    default=CACHE_DIR,
+    type=str,
+)
+argparser.add_argument(
+    "--cache-size",
+    help="Maximum size of the annotation cache in MiB. Default '%(default)s'.",
+    default=CACHE_SIZE,
+    type=int,
+)
+argparser.add_argument(
+    "--no-cache",
+    help="Don't use the annotation cache. Default '%(default)s'.",
+    action="store_true",
+    default=False,
+)
+argparser.add_argument(
+    "--batch-commits",
+    help=(
+        "Write all commits through a single `git fast-import` process instead of"
+        " running git for every file, annotations get a commit of their own."
+        " Default '%(default)s'."
+    ),
+    action="store_true",
+    default=False,
+)
+argparser.add_argument(
+    "--incremental",
+    help=(
+        "Only sync files that changed in CPython since the commit recorded for"
+        " them in the sync state of RustPython. Default '%(default)s'."
+    ),
+    action="store_true",
+    default=False,
+)
+argparser.add_argument(
+    "--report",
+    help=(
+        "Write the time spent in each stage (reading, collecting, annotating,"
+        " writing and running git), per file and in total, to the given JSON file."
+        " Default '%(default)s'."
+    ),
+    default=None,
+    type=str,
+)
+argparser.add_argument(
+    "--profile-memory",
+    help=(
+        "Trace the memory allocated in each stage, per file, and report the peaks"
+        " along with the files allocating the most. Included in '--report'."
+        " Requires Python 3.9 or greater. Default '%(default)s'."
+    ),
+    action="store_true",
+    default=False,
+)
+argparser.add_argument(
+    "--execute",
+    help=(
+        "Run the changed test files with '--interpreter' after syncing them and"
+        " report the result of every test. Default '%(default)s'."
+    ),
+    action="store_true",
+    default=False,
+)
+argparser.add_argument(
+    "--interpreter",
+    help=(
+        "Interpreter test files are run with, any Python interpreter will do."
+        f" Default '<rustpython>/{RUSTPYTHON_BINARY}'."
+    ),
+    default=None,
+    type=str,
+)
+argparser.add_argument(
+    "--timeout",
+    help="Seconds a test file may run for. Default '%(default)s'.",
+    default=TIMEOUT,
+    type=float,
+)
+argparser.add_argument(
+    "--results",
+    help=(
+        "Write the status of every test run by '--execute' to the given JSON"
+        " file. Default '%(default)s'."
+    ),
+    default=None,
+    type=str,
+)
 # TODO: Support dry run?
 argparser.add_argument(
     "--dry",
@@ -85,7 +275,31 @@ def validate(args: argparse.Namespace) -> None:
         fmt.append(f"Path '{args.rustpython}' to RustPython is not a directory")
     if args.branch <= MIN_BRANCH:
         fmt.append(f"Branch '{args.branch}' is less than minimum branch '{MIN_BRANCH}'")
-    if args.branch != cpython_branch(args.cpython):
+    if bool(args.filenames) == args.all:
+        fmt.append("Either pass the names of the test files or '--all'")
+    if args.memory_budget < 1:
+        fmt.append(f"Memory budget must be at least 1MiB, got '{args.memory_budget}'")
+    if args.profile_memory and sys.version_info < (3, 9):
+        fmt.append("Profiling memory requires python 3.9 or greater")
+    if args.jobs < 1:
+        fmt.append(f"Number of jobs must be at least 1, got '{args.jobs}'")
+    if args.execute:
+        if args.interpreter is None:
+            args.interpreter = str(Path(args.rustpython) / RUSTPYTHON_BINARY)
+        interpreter = shutil.which(args.interpreter)
+        if interpreter is None:
+            fmt.append(f"Interpreter '{args.interpreter}' is not an executable")
+        else:
+            args.interpreter = os.path.abspath(interpreter)
+        if args.timeout <= 0:
+            fmt.append(f"Timeout must be positive, got '{args.timeout}'")
+    if args.ref:
+        # nothing is read from the work tree, no need to check the branch.
+        commit = git_resolve(args.cpython, args.ref)
+        if commit is None:
+            fmt.append(f"Ref '{args.ref}' does not name a commit in CPython")
+        args.ref = commit
+    elif args.branch != cpython_branch(args.cpython):
         fmt.append(f"CPython branch is not set to {args.branch}")
     if fmt:
         print(f"[ERROR]: {fmt}", file=sys.stderr)
@@ -106,7 +320,13 @@ def main() -> None:
     # ok to assume from here-on out that git is here.
     args = argparser.parse_args()
     validate(args)
-    Driver(args).run()
+    # imported once the arguments check out, asyncio isn't free either.
+    driver: Type[Driver] = Driver
+    if args.use_async:
+        from zoot.asyncdrive import AsyncDriver
+
+        driver = AsyncDriver
+    driver(args).run()
 
 if __name__ == "__main__":
     main()
@@ -2,12 +2,27 @@
 These are then re-applied to the copied file.
 """
 import sys
-from typing import Optional, TypeVar, List, Set, Tuple, MutableMapping, Type, Union
+from typing import (
+    Optional,
+    TypeVar,
+    List,
+    Set,
+    Tuple,
+    MutableMapping,
+    Type,
+    Union,
+    Sequence,
+)
 from libcst import Decorator, FunctionDef, ClassDef, EmptyLine, matchers as m
 import libcst
 
+from zoot.report import Timer
+
 # currently, we only care about skip and expectedFailure of unittest.
 _ATTR_NAMES: Set[str] = {"skip", "expectedFailure"}
+# Indentation used when rendering a CompactMeta, a tab doesn't collide with the
+# indentation used in the test files.
+COMPACT_INDENT = "\t"
 
 
 class NodeMeta:
@@ -21,6 +36,97 @@ class NodeMeta:
         self.leading_comments = leading_comments
 
 
+class CompactMeta:
+    """Compact form of NodeMeta holding source text instead of libcst nodes. Can
+    be pickled cheaply or stored on disk.
+
+    The text is rendered as if the target was in a block indented with
+    COMPACT_INDENT, lines libcst indents start with it, while lines that don't
+    follow the indentation of the target are kept verbatim.
+    """
+
+    __slots__ = ("target", "decos", "comments")
+
+    # Qualified name of the target, `Class` or `Class.function`.
+    target: str
+    # Source of each decorator, including any comments preceding it.
+    decos: Tuple[str, ...]
+    # Source of each leading comment.
+    comments: Tuple[str, ...]
+
+    def __init__(self, target: str, decos: Sequence[str], comments: Sequence[str]):
+        self.target = target
+        self.decos = tuple(decos)
+        self.comments = tuple(comments)
+
+    def __getstate__(self):
+        return self.target, self.decos, self.comments
+
+    def __setstate__(self, state):
+        self.target, self.decos, self.comments = state
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CompactMeta):
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    def __repr__(self) -> str:
+        return f"CompactMeta({self.target!r}, {self.decos!r}, {self.comments!r})"
+
+    @property
+    def key(self) -> Union[str, Tuple[str, str]]:
+        """The key of the target in ClassDecos or FuncDecos."""
+        cls_name, _, func_name = self.target.partition(".")
+        return (cls_name, func_name) if func_name else cls_name
+
+    @classmethod
+    def from_meta(cls, target: str, meta: NodeMeta) -> "CompactMeta":
+        decos = [_render(decorators=[deco]) for deco in meta.decos]
+        comments = [_render(leading_lines=[line]) for line in meta.leading_comments]
+        return cls(target, decos, comments)
+
+    def to_meta(self) -> NodeMeta:
+        # The placeholder decorator makes sure comments preceding the first of
+        # our decorators are attached to it and not to the function.
+        source = "".join(
+            [
+                "class _:\n",
+                *self.comments,
+                f"{COMPACT_INDENT}@_\n",
+                *self.decos,
+                f"{COMPACT_INDENT}def _(): pass\n",
+            ]
+        )
+        outer = libcst.parse_module(source).body[0]
+        assert isinstance(outer, ClassDef)
+        node = outer.body.body[0]
+        assert isinstance(node, FunctionDef)
+        return NodeMeta(list(node.decorators[1:]), list(node.leading_lines))
+
+
+def _render(
+    decorators: Sequence[Decorator] = (),
+    leading_lines: Sequence[EmptyLine] = (),
+    indent: str = COMPACT_INDENT,
+) -> str:
+    """Render the given decorators/comments as if they preceded a function in a
+    block indented with indent.
+    """
+    func = FunctionDef(
+        name=libcst.Name("_"),
+        params=libcst.Parameters(),
+        body=libcst.SimpleStatementSuite([libcst.Pass()]),
+        decorators=decorators,
+        leading_lines=leading_lines,
+    )
+    if not indent:
+        return libcst.Module(body=[func]).code_for_node(func).rpartition("def _(")[0]
+    block = libcst.IndentedBlock(body=[func], indent=indent)
+    code = libcst.Module(body=[ClassDef(name=libcst.Name("_"), body=block)]).code
+    # strip the class header and the function definition.
+    return code[code.index("\n") + 1 : code.rindex(f"{indent}def _(")]
+
+
 # helpful shorthands
 if sys.version_info.minor >= 10:
     from typing import TypeAlias  # type: ignore
@@ -30,24 +136,58 @@ if sys.version_info.minor >= 10:
 else:
     FuncDecos = MutableMapping[Tuple[str, str], NodeMeta]  # type: ignore
     ClassDecos = MutableMapping[str, NodeMeta]  # type: ignore
+
+
+def compact(func_decos: FuncDecos, cls_decos: ClassDecos) -> List[CompactMeta]:
+    """Convert the collected decorators to their compact form."""
+    metas: List[CompactMeta] = []
+    for cls_name, meta in cls_decos.items():
+        metas.append(CompactMeta.from_meta(cls_name, meta))
+    for (cls_name, func_name), meta in func_decos.items():
+        metas.append(CompactMeta.from_meta(f"{cls_name}.{func_name}", meta))
+    return metas
+
+
+def expand(metas: Sequence[CompactMeta]) -> Tuple[FuncDecos, ClassDecos]:
+    """Convert compact metadata back to the mappings used by DecoAnnotator."""
+    func_decos: FuncDecos = {}
+    cls_decos: ClassDecos = {}
+    for meta in metas:
+        key = meta.key
+        if isinstance(key, tuple):
+            func_decos[key] = meta.to_meta()
+        else:
+            cls_decos[key] = meta.to_meta()
+    return func_decos, cls_decos
+
+
 # Seems to do the trick with classmethod
 DA = TypeVar("DA", bound="DecoAnnotator")
 
-# TODO: There's traversals we can probably still skip.
+
 class DecoCollector(m.MatcherDecoratableVisitor):
-    """Collects all decorators related to RustPython from a given file."""
+    """Collects all decorators related to RustPython from a given file.
+
+    If prune is set and a module is visited, only statements are walked and
+    expressions are only visited inside simple statements, in search of comments.
+    Results (and warnings) are the same as those of the full traversal.
+    """
 
     # Mapping from function/class names to decorators (@skip or @expectedFailure)
     func_decos: FuncDecos
     cls_decos: ClassDecos
     current_class_name: str
     current_func_name: str
+    # Warnings emitted for comments that need manual intervention.
+    warnings: List[str]
 
-    def __init__(self, fname: Optional[str] = None):
+    def __init__(self, fname: Optional[str] = None, prune: bool = False):
         self.current_class_name = self.current_func_name = ""
         self.fname = fname
+        self.prune = prune
         self.func_decos = {}
         self.cls_decos = {}
+        self.warnings = []
         super().__init__()
 
     def info(self) -> str:
@@ -55,6 +195,14 @@ class DecoCollector(m.MatcherDecoratableVisitor):
         c = f"class decorators = {len(self.cls_decos)}" 
         return f"Caught decorators for '{self.fname}': {f}, {c}"
 
+    def collect(self, source: str, timer: Optional[Timer] = None) -> None:
+        """Parse the source and visit it, timing both if a timer is given."""
+        timer = timer or Timer()
+        with timer.stage("collect-parse"):
+            module = libcst.parse_module(source)
+        with timer.stage("collect-visit"):
+            module.visit(self)
+
     # visit if in a class which has at least one base class
     # and at least one decorator.
     @m.call_if_inside(m.ClassDef(bases=[m.AtLeastN(n=1)]))
@@ -64,6 +212,9 @@ class DecoCollector(m.MatcherDecoratableVisitor):
         those that have a preceding comment mentioning RustPython (usually
         expectedFailure).
         """
+        self._collect_func(node)
+
+    def _collect_func(self, node: FunctionDef) -> None:
         self.current_func_name = node.name.value
         if len(node.decorators) == 0:
             return
@@ -93,6 +244,9 @@ class DecoCollector(m.MatcherDecoratableVisitor):
 
         # TODO: Doesn't catch everything, see test_list.py
         """
+        self._check_comment(node)
+
+    def _check_comment(self, node: libcst.Comment) -> None:
         needle = "rustpython"
         fname = f"'{self.fname}'" if self.fname else "the file"
         if _check_comment(node, needle):
@@ -105,13 +259,47 @@ class DecoCollector(m.MatcherDecoratableVisitor):
                 "\nThis comment could be in a top level block or inside a function"
                 " and probably requires manual intervention."
             )
-            print(msg, file=sys.stderr)
+            self.warn(msg)
+
+    def visit_Module(self, node: libcst.Module) -> bool:
+        """Walk the statements ourselves if pruning, skipping the traversal."""
+        if not self.prune:
+            return True
+        self._walk(node.body, False)
+        return False
+
+    def _walk(self, body: Sequence[libcst.CSTNode], in_class: bool) -> None:
+        """Walk the statements of a block, in_class signals if we're inside a
+        class with base classes. Mirrors the order of the full traversal.
+        """
+        for stmt in body:
+            if isinstance(stmt, libcst.SimpleStatementLine):
+                for comment in _comments(stmt):
+                    self._check_comment(comment)
+            elif isinstance(stmt, ClassDef):
+                self.visit_ClassDef(stmt)
+                self._walk(stmt.body.body, in_class or len(stmt.bases) > 0)
+            elif isinstance(stmt, FunctionDef):
+                if in_class:
+                    self._collect_func(stmt)
+                self._walk(stmt.body.body, in_class)
+            elif isinstance(stmt, libcst.IndentedBlock):
+                self._walk(stmt.body, in_class)
+            elif isinstance(stmt, _COMPOUND):
+                # if/else, try/except, loops and the like, grab their blocks.
+                self._walk(stmt.children, in_class)
+
+    def warn(self, msg: str) -> None:
+        """Record the warning and print it to stderr."""
+        self.warnings.append(msg)
+        print(msg, file=sys.stderr)
 
     def clear(self):
         """Clear all instance data."""
         self.current_class_name = self.current_func_name = ""
         self.func_decos = {}
         self.cls_decos = {}
+        self.warnings = []
 
 
 class DecoAnnotator(m.MatcherDecoratableTransformer):
@@ -132,6 +320,18 @@ class DecoAnnotator(m.MatcherDecoratableTransformer):
     def from_collector(cls: Type[DA], collector: DecoCollector) -> DA:
         return cls(collector.func_decos, collector.cls_decos)
 
+    def annotate(self, source: str, timer: Optional[Timer] = None) -> str:
+        """Parse the source and return it annotated, timing the parse, the visit
+        and generating the code if a timer is given.
+        """
+        timer = timer or Timer()
+        with timer.stage("annotate-parse"):
+            module = libcst.parse_module(source)
+        with timer.stage("annotate-visit"):
+            module = module.visit(self)
+        with timer.stage("codegen"):
+            return module.code
+
     @staticmethod
     def _add_metadata(
         metadata: NodeMeta, updated_node: Union[FunctionDef, ClassDef]
@@ -177,6 +377,37 @@ class DecoAnnotator(m.MatcherDecoratableTransformer):
 
 # Helpers
 
+# Nodes that can hold statements (directly or by holding nodes that do).
+_COMPOUND = (
+    libcst.BaseCompoundStatement,
+    libcst.Else,
+    libcst.ExceptHandler,
+    libcst.ExceptStarHandler,
+    libcst.Finally,
+    libcst.MatchCase,
+)
+
+
+class _CommentGrabber(libcst.CSTVisitor):
+    """Plain visitor grabbing all comments, cheaper than going through
+    the matchers of DecoCollector.
+    """
+
+    def __init__(self) -> None:
+        self.comments: List[libcst.Comment] = []
+        super().__init__()
+
+    def visit_Comment(self, node: libcst.Comment) -> None:
+        self.comments.append(node)
+
+
+def _comments(node: libcst.CSTNode) -> List[libcst.Comment]:
+    """All comments found in node."""
+    grabber = _CommentGrabber()
+    node.visit(grabber)
+    return grabber.comments
+
+
 
 def rustpython_deco(deco: Decorator, has_comment: bool = False) -> bool:
     """Match against the class of deco.decorator. If its
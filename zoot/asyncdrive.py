@@ -0,0 +1,121 @@
+""" An asyncio based driver, overlapping the I/O of a sync with the CPU bound work.
+
+Reading the test files for the next rows happens in a thread, collecting and
+annotating happens in a process pool and the results are written and committed, in
+order, by a single coroutine running git through `asyncio.create_subprocess_exec`.
+While the annotations of one unit are being committed, the following files are read
+and annotated, so the wall time of a sync approaches the time spent annotating.
+"""
+import asyncio
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from typing import AsyncIterator, List, Tuple
+
+from zoot.drive import Driver, Row, Synced
+from zoot.helpers import Git
+
+# Rows read ahead for each worker, bounds the files held in memory.
+READ_AHEAD = 2
+
+
+class AsyncDriver(Driver):
+    """Same history as Driver, different scheduling."""
+
+    def run(self) -> None:
+        asyncio.run(self.arun())
+
+    async def arun(self) -> None:
+        totals = [0, 0, 0]
+        self.prepare()
+        self.checkout_test_branch()
+        with self._batching():
+            async for unit, pairs in self._units():
+                for i, count in enumerate(await self.async_unit(unit, pairs)):
+                    totals[i] += count
+        self.finish(*totals)
+
+    async def _units(self) -> AsyncIterator[Tuple[str, List[Tuple[Row, Synced]]]]:
+        """Yield the rows of each unit along with the result of syncing them."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.jobs * READ_AHEAD)
+        sync = self.syncer()
+
+        async def produce(pool: ProcessPoolExecutor, reader: ThreadPoolExecutor):
+            rows = self.rows()
+            try:
+                while True:
+                    row = await loop.run_in_executor(reader, next, rows, None)
+                    if row is None:
+                        break
+                    await queue.put((row, loop.run_in_executor(pool, sync, row)))
+            finally:
+                await queue.put(None)
+
+        with ProcessPoolExecutor(self.jobs) as pool, ThreadPoolExecutor(1) as reader:
+            producer = asyncio.ensure_future(produce(pool, reader))
+            unit = ""
+            pairs: List[Tuple[Row, Synced]] = []
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    row, future = item
+                    key = row.package or row.filename
+                    if pairs and key != unit:
+                        yield unit, pairs
+                        pairs = []
+                    unit = key
+                    pairs.append((row, await future))
+                if pairs:
+                    yield unit, pairs
+                # surface errors raised while reading.
+                await producer
+            finally:
+                producer.cancel()
+
+    async def async_unit(
+        self, unit: str, pairs: List[Tuple[Row, Synced]]
+    ) -> Tuple[int, int, int]:
+        """Like Driver.sync_unit, files are written in a thread and git is run
+        without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        updated, annotated, fast_files = await loop.run_in_executor(
+            None, self.write_update, unit, pairs
+        )
+        self.record(unit, [row for row, _ in pairs])
+        if updated:
+            await self.acommit(unit, updated)
+        marked = await loop.run_in_executor(None, self.write_annotations, annotated)
+        if marked:
+            await self.acommit_annotations(unit, marked)
+        if updated or marked:
+            self.changed.append(unit)
+        return len(pairs), fast_files, self.unchanged(pairs, updated + marked)
+
+    async def acommit(self, unit: str, names: List[str]) -> None:
+        """See Driver.commit."""
+        if self.batch:
+            # fast-import is fed through a pipe, nothing to wait on.
+            return self.commit(unit, names)
+        git = Git(self.testlib.rustpython_testlib)
+        # nothing else may be staged in between.
+        async with git.atransaction():
+            with self.stage(unit, "git-add"):
+                await git.awrite("add", unit)
+            with self.stage(unit, "git-commit"):
+                try:
+                    await git.awrite("commit", "-m", self.update_message(unit))
+                except subprocess.CalledProcessError:
+                    # restore the file if the commit fails, see git_commit.
+                    with suppress(subprocess.CalledProcessError):
+                        await git.awrite("restore", "--staged", unit)
+
+    async def acommit_annotations(self, unit: str, names: List[str]) -> None:
+        """See Driver.commit_annotations."""
+        if self.batch:
+            return self.commit_annotations(unit, names)
+        with self.stage(unit, "git-add"):
+            await Git(self.testlib.rustpython_testlib).awrite("add", unit)
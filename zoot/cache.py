@@ -0,0 +1,93 @@
+""" On-disk cache for the annotations collected from RustPython test files.
+
+Entries are keyed by the name and the git blob hash of the content of the
+RustPython file, so an unchanged file never needs to be parsed again. The name is
+part of the key since the warnings replayed on a hit mention it. The cache is
+bounded in size, the least recently used entries are evicted first.
+"""
+import os
+import pickle
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, List, Tuple, NamedTuple, Union
+
+from zoot.helpers import blob_sha
+
+if TYPE_CHECKING:
+    # pulls in libcst, unpickling entries imports it when needed.
+    from zoot.annotate import CompactMeta
+
+CACHE_DIR = Path.home() / ".cache" / "zoot"
+# In MiB.
+CACHE_SIZE = 64
+# Bump this whenever the format of the cached entries changes.
+CACHE_VERSION = 2
+
+
+class Entry(NamedTuple):
+    """The annotations collected from a RustPython test file."""
+
+    metas: List["CompactMeta"]
+    # Warnings emitted by the collector, replayed on a hit.
+    warnings: List[str]
+
+
+class AnnotationCache:
+    """A size bounded, least recently used, cache of collected annotations."""
+
+    path: Path
+    max_size: int
+
+    def __init__(self, path: Union[Path, str], max_size: int) -> None:
+        self.path = Path(path) / f"v{CACHE_VERSION}"
+        self.max_size = max_size
+
+    def entry_path(self, name: str, content: str) -> Path:
+        """Where the entry for the named file with the given content is stored."""
+        sha = blob_sha(f"{name}\0{blob_sha(content)}")
+        return self.path / sha[:2] / sha[2:]
+
+    def get(self, name: str, content: str) -> Optional[Entry]:
+        """Grab the entry for the named file with the given content, if present."""
+        path = self.entry_path(name, content)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupt or written by an incompatible version of libcst, drop it.
+            path.unlink(missing_ok=True)
+            return None
+        # Mark it as recently used.
+        os.utime(path)
+        return entry
+
+    def put(self, name: str, content: str, entry: Entry) -> None:
+        """Store the entry for the named file with the given content."""
+        path = self.entry_path(name, content)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so concurrent workers never read
+        # a partially written entry.
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def evict(self) -> int:
+        """Remove the least recently used entries until the cache fits in
+        max_size. Returns the number of entries removed.
+        """
+        entries: List[Tuple[float, int, Path]] = []
+        total = 0
+        for path in self.path.glob("*/*"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
@@ -1,16 +1,64 @@
 from pathlib import Path
-from typing import Generator, Union, List, Optional, NamedTuple
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+from functools import partial
+from itertools import groupby, tee
 import subprocess
 import argparse
+import filecmp
+import io
+import json
+import os
+import shutil
+import sys
 
-from libcst import parse_module
+from zoot.cache import AnnotationCache, Entry
+from zoot.execute import run_modules, save_results
+from zoot.libindex import LIB_MAP, LibIndex
+from zoot.report import Report, Timer
+from zoot.state import STATE_FILE, SyncState
+from zoot.helpers import (
+    Git,
+    GitBatch,
+    GitObjects,
+    TreeEntry,
+    blob_sha,
+    git_add,
+    git_checkout,
+    git_commit,
+    git_ls_tree,
+    git_resolve,
+)
 
-from zoot.annotate import DecoCollector, DecoAnnotator
-from zoot.helpers import git_add, git_add_commit, git_checkout
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+    # libcst is imported along with these, only once a file needs parsing.
+    from zoot.annotate import DecoCollector
 
 CPYTHON_LIB = Path("Lib")
 RUSTPYTHON_LIB = Path("pylib") / "Lib"
+# Default budget for the files in flight when running in parallel, in MiB.
+MEMORY_BUDGET = 2048
+# Memory needed to parse a file, per byte of source. Parsing with libcst peaks at
+# about 130 times the size of the file.
+MEMORY_FACTOR = 150
 
 
 def keep_print():
@@ -25,6 +73,8 @@ def keep_print():
 
 # Per-file, print only if verbose is set.
 verbose_print = keep_print()
+# Summaries, always printed.
+report_print = verbose_print(True)
 
 
 class Driver:
@@ -32,7 +82,38 @@ class Driver:
         globals()["print"] = verbose_print(args.verbose)
         self.branch = args.branch
         self.dry = args.dry
+        self.jobs = args.jobs
+        self.collector = args.collector
+        self.annotator = args.annotator
+        self.cache = (
+            None
+            if args.no_cache
+            else AnnotationCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        )
         self.testlib = TestLib(args)
+        self.state = SyncState.load(self.testlib.rustpython_lib / STATE_FILE)
+        self.incremental = args.incremental
+        # Commits are streamed to `git fast-import` if batching.
+        self.batch = (
+            GitBatch(self.testlib.rustpython_testlib)
+            if args.batch_commits and not args.dry
+            else None
+        )
+        # Where to write the timings of the run to, if anywhere.
+        self.report_path = args.report
+        self.memory_budget = args.memory_budget * 1024 * 1024
+        self.profile_memory = args.profile_memory
+        self.report = (
+            Report(self.profile_memory)
+            if args.report or self.profile_memory
+            else None
+        )
+        # Interpreter the updated test modules are run with, if running them.
+        self.interpreter = args.interpreter if args.execute else None
+        self.timeout = args.timeout
+        self.results_path = args.results
+        # Units written to RustPython, in the order they were synced.
+        self.changed: List[str] = []
 
     def run(self) -> None:
         """
@@ -44,37 +125,306 @@ class Driver:
         3. If the file fails, additional by-hand annotations are needed -> Done
 
         [Done]: Commit the new file with message: "Mark failing tests."
+
+        With '--execute', the files changed are run after syncing and the tests
+        failing are reported, step 2 and 3 are left to do by hand.
+
+        When batching commits, the annotated file is committed right away with
+        message "Mark failing tests in <name>." and all commits are written
+        to the repository in one go at the end.
         """
-        dry = self.dry
+        total_files = total_fast = total_unchanged = 0
+        self.prepare()
         self.checkout_test_branch()
-        for testname, cpy, rustpy, libname, libfile in self.testlib:
-            print(f"> Processing '{testname}'")
-            # handle the library file
-            self.write_lib(libname, libfile)
+        # Parsing and annotating is done (possibly in parallel) by the mapper, writing
+        # and committing is done here, in order, so the history looks the same
+        # regardless of the number of jobs used.
+        rows, todo = tee(self.rows())
+        with self._mapper() as mapper, self._batching():
+            sync = self.syncer()
+            # A unit is either a single test file or all the files of a package.
+            units = groupby(
+                zip(rows, mapper(sync, todo)),
+                key=lambda pair: pair[0].package or pair[0].filename,
+            )
+            for unit, pairs in units:
+                synced_files, fast_files, unchanged = self.sync_unit(unit, list(pairs))
+                total_files += synced_files
+                total_fast += fast_files
+                total_unchanged += unchanged
+        self.finish(total_files, total_fast, total_unchanged)
+
+    def syncer(self) -> Callable[["Row"], "Synced"]:
+        """sync_row with the options of the run applied, picklable."""
+        return partial(
+            sync_row,
+            cache=self.cache,
+            collector=self.collector,
+            annotator=self.annotator,
+            trace=self.profile_memory,
+        )
+
+    def rows(self) -> Iterator["Row"]:
+        """The rows of the test lib, recording the size of their files."""
+        for row in self.testlib:
+            if self.report:
+                self.report.file(row.filename).bytes += row.size
+            yield row
+
+    def stage(self, name: Optional[str], stage: str) -> ContextManager[None]:
+        """Time a stage of a file, or of the run if name is None, when reporting."""
+        return self.report.stage(name, stage) if self.report else nullcontext()
 
-            # Read annotations present in the RustPython file:
-            collect = DecoCollector(testname)
-            parse_module(rustpy).visit(collect)
-            print(collect.info())
+    def tally(self, synced: "Synced") -> None:
+        """Add the timings and counts of the worker to the report."""
+        if not self.report:
+            return
+        report = self.report.file(synced.filename)
+        report.merge(synced.stages, synced.memory)
+        report.func_decos, report.cls_decos = synced.decos
+
+    def prepare(self) -> None:
+        """Report on and pick the test files to sync."""
+        self.report_one_sided()
+        if self.incremental:
+            skipped = self.testlib.skip_unchanged(self.state)
+            report_print(f"Skipping {len(skipped)} files unchanged since last synced.")
+            for name in skipped:
+                print(f"'{name}' is unchanged in CPython.")
+
+    def finish(self, total_files: int, total_fast: int, total_unchanged: int) -> None:
+        """Save the sync state, report and clean up after a run."""
+        self.testlib.close()
+        self.save_state()
+        report_print(
+            f"Synced {total_files} test files, {total_fast} without RustPython"
+            f" markers were copied as is, {total_unchanged} were already up to date."
+        )
+        if self.interpreter and self.changed:
+            self.execute()
+        report = self.report
+        if report is not None and self.report_path:
+            report.save(self.report_path)
+            report_print(f"Wrote timings to '{self.report_path}':")
+            for line in report.summary():
+                report_print(f"    {line}")
+        if report is not None and self.profile_memory:
+            report_print("Peak memory allocated per stage:")
+            for line in report.memory_summary():
+                report_print(f"    {line}")
+        if self.cache:
+            evicted = self.cache.evict()
+            print(f"Evicted {evicted} entries from the annotation cache.")
+
+    def sync_unit(
+        self, unit: str, pairs: List[Tuple["Row", "Synced"]]
+    ) -> Tuple[int, int, int]:
+        """Write out and commit the files of a unit, a test file or package. Files
+        already holding the right contents are neither written nor committed.
+        Returns the number of files synced, how many of them were copied as is and
+        how many were already up to date.
+        """
+        updated, annotated, fast_files = self.write_update(unit, pairs)
+        self.record(unit, [row for row, _ in pairs])
+        if updated:
+            self.commit(unit, updated)
+        marked = self.write_annotations(annotated)
+        if marked:
+            self.commit_annotations(unit, marked)
+        if updated or marked:
+            self.changed.append(unit)
+        return len(pairs), fast_files, self.unchanged(pairs, updated + marked)
+
+    def unchanged(self, pairs: List[Tuple["Row", "Synced"]], written: List[str]) -> int:
+        """Number of files of a unit that were already up to date."""
+        if self.dry:
+            return 0
+        return sum(row.filename not in written for row, _ in pairs)
 
-            # Got the annotations, write to RustPython file and commit.
+    def execute(self) -> None:
+        """Run the changed test modules with the interpreter, report the tests
+        failing and those marked that no longer do.
+        """
+        interpreter = self.interpreter
+        # validate requires it with --execute.
+        assert interpreter is not None
+        report_print(f"Running {len(self.changed)} test modules with '{interpreter}'.")
+        results = []
+        totals: Counter = Counter()
+        for result in run_modules(
+            interpreter,
+            self.testlib.rustpython_lib,
+            self.changed,
+            self.jobs,
+            self.timeout,
+        ):
+            results.append(result)
+            if self.report:
+                self.report.file(result.unit).add("execute", result.duration)
+            counts = result.counts()
+            totals.update(counts)
+            print(f"'{result.unit}': {_counts(counts)} in {result.duration:.2f}s.")
+            if result.timed_out:
+                report_print(f"'{result.unit}' timed out after {self.timeout}s.")
+            elif result.crashed:
+                report_print(f"'{result.unit}' exited with {result.returncode}:")
+                report_print(result.tail)
+            for test, status in result.failing():
+                report_print(f"    {status}: {result.unit} {test}")
+        report_print(f"Ran {sum(totals.values())} tests, {_counts(totals)}.")
+        if self.results_path:
+            save_results(self.results_path, results)
+            report_print(f"Wrote test results to '{self.results_path}'.")
+
+    def write_update(
+        self, unit: str, pairs: List[Tuple["Row", "Synced"]]
+    ) -> Tuple[List[str], List[Tuple[str, str]], int]:
+        """Write the CPython files of a unit. Returns the files that changed, the
+        annotated code left to write for them and how many were copied as is.
+        """
+        dry = self.dry
+        annotated = []
+        updated: List[str] = []
+        fast_files = 0
+        print(f"> Processing '{unit}'")
+        # handle the library file, only the first row of a unit holds it.
+        with self.stage(unit, "write-lib"):
+            self.write_lib(pairs[0][0].libname)
+        for row, synced in pairs:
+            testname = row.filename
+            if row.package:
+                print(f"> Processing '{testname}'")
+            print(synced.info)
+            self.tally(synced)
+
+            if synced.code is None:
+                # No annotations to apply, copy the file as is.
+                fast_files += 1
+                print(f"Copying CPython file for '{testname}' as is.")
+                with self.stage(testname, "write"):
+                    if not dry and self.testlib.copy_to_rustpython(testname):
+                        updated.append(testname)
+                continue
+
+            with self.stage(testname, "write"):
+                current = not dry and self.testlib.is_current(testname, synced.code)
+            if current:
+                # Both commits would cancel out, skip them.
+                print(f"'{testname}' is already up to date.")
+                continue
+            # Got the annotations, write to RustPython file.
             print(f"Writing CPython file for '{testname}' to RustPython test library.")
-            if not dry:
-                self.testlib.write_to_rustpython(testname, cpy)
-                git_add_commit(
-                    testname,
-                    self.testlib.rustpython_testlib,
-                    f"Update {testname} from CPython {self.branch}.",
-                )
-            # Apply the annotations to the CPython file.
+            with self.stage(testname, "write"):
+                # read again, rather than holding on to it since the row was read.
+                cpython_test = _load(row.cpython_test)
+                if not dry and self.testlib.write_to_rustpython(testname, cpython_test):
+                    updated.append(testname)
+                del cpython_test
+            annotated.append((testname, synced.code))
+        if pairs[0][0].package:
+            # files gone from the CPython package go, along with the update.
+            kept = {row.filename for row, _ in pairs}
+            for name in self.testlib.stale_files(unit, kept):
+                print(f"Removing '{name}', it is no longer in CPython.")
+                with self.stage(unit, "write"):
+                    if not dry:
+                        self.testlib.remove_from_rustpython(name)
+                        updated.append(name)
+        return updated, annotated, fast_files
+
+    def write_annotations(self, annotated: List[Tuple[str, str]]) -> List[str]:
+        """Write the annotated files, returns those that changed."""
+        marked = []
+        for testname, code in annotated:
             print(f"Applying annotations to '{testname}'.")
-            annotate = DecoAnnotator.from_collector(collect)
-            module = parse_module(cpy).visit(annotate)
-            if not dry:
-                self.testlib.write_to_rustpython(testname, module.code)
-                git_add(testname, self.testlib.rustpython_testlib)
+            with self.stage(testname, "write"):
+                if not self.dry and self.testlib.write_to_rustpython(testname, code):
+                    marked.append(testname)
+        return marked
 
-            # TODO: Run against tip of rustpython repo and catch new errors.
+    @contextmanager
+    def _batching(self) -> Iterator[None]:
+        """Write out the batched commits, even if syncing fails midway."""
+        try:
+            yield
+        finally:
+            if self.batch:
+                with self.stage(None, "git-fast-import"):
+                    self.batch.close()
+                print(f"Wrote {self.batch.commits} commits.")
+
+    def report_one_sided(self) -> None:
+        """Report discovered test files present in a single repository."""
+        for repo, names in (
+            ("CPython", self.testlib.only_cpython),
+            ("RustPython", self.testlib.only_rustpython),
+        ):
+            if names:
+                report_print(f"{len(names)} test files only in {repo}:")
+                report_print(f"    {', '.join(names)}")
+
+    def record(self, unit: str, rows: List["Row"]) -> None:
+        """Record the CPython commit the files of a unit are synced from."""
+        commit = self.testlib.commit
+        if self.dry or commit is None:
+            return
+        self.state.record(Path("test") / unit, commit)
+        for row in rows:
+            if row.libname:
+                self.state.record(row.libname, commit)
+
+    def save_state(self) -> None:
+        """Write out and stage the sync state."""
+        if self.dry or not self.state.synced:
+            return
+        self.state.save()
+        with self.stage(None, "git-add"):
+            git_add(STATE_FILE, self.testlib.rustpython_lib)
+
+    def update_message(self, unit: str) -> str:
+        return f"Update {unit} from CPython {self.branch}."
+
+    def commit(self, unit: str, names: List[str]) -> None:
+        """Commit the CPython version of a test file or package."""
+        msg = self.update_message(unit)
+        if self.batch:
+            with self.stage(unit, "git-fast-import"):
+                for name in names:
+                    self.batch.add(name)
+                self.batch.commit(msg)
+            return
+        path = self.testlib.rustpython_testlib
+        # nothing else may be staged in between.
+        with Git(path).transaction():
+            with self.stage(unit, "git-add"):
+                git_add(unit, path)
+            with self.stage(unit, "git-commit"):
+                git_commit(unit, path, msg)
+
+    def commit_annotations(self, unit: str, names: List[str]) -> None:
+        """Stage the annotated files of a unit, commit them if batching."""
+        if self.batch:
+            with self.stage(unit, "git-fast-import"):
+                for name in names:
+                    self.batch.add(name)
+                self.batch.commit(f"Mark failing tests in {unit}.")
+        else:
+            with self.stage(unit, "git-add"):
+                git_add(unit, self.testlib.rustpython_testlib)
+
+    @contextmanager
+    def _mapper(self) -> Iterator:
+        """Yield a `map` like callable, backed by a process pool if more than
+        one job was requested. Rows are only handed to the pool while the memory
+        needed for those in flight fits the budget.
+        """
+        if self.jobs <= 1:
+            yield map
+            return
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            yield partial(bounded_map, pool, self.memory_budget)
 
     def checkout_test_branch(self) -> None:
         """Checkout a new branch for the tests. Make it somewhat unique by attaching
@@ -85,34 +435,203 @@ class Driver:
         trail = repr(datetime.now().timestamp()).replace(".", "")
         branch_name = f"update_stdlib_{trail}"
         try:
-            git_checkout(self.testlib.rustpython_testlib, branch_name)
+            with self.stage(None, "git-checkout"):
+                git_checkout(self.testlib.rustpython_testlib, branch_name)
         except subprocess.CalledProcessError as e:
             print(f"Failed to checkout branch '{branch_name}'. Exiting.")
             raise e
 
-    def write_lib(self, libname: Optional[str], libfile: Optional[str]) -> None:
-        """Write the library file to the RustPython test lib."""
-        if libname and libfile:
+    def write_lib(self, libname: Optional[str]) -> None:
+        """Copy the library file or package to the RustPython lib."""
+        if libname:
             print(f"Copying library '{libname}' from '{self.testlib.cpython_lib}'.")
             if not self.dry:
-                self.testlib.write_to_rustpython(libname, libfile, lib=True)
+                copied, same, removed = self.testlib.copy_lib(libname)
+                print(
+                    f"Copied {copied} files, {same} were already up to date,"
+                    f" removed {removed} no longer in CPython."
+                )
         else:
             print("Library not found.")
 
 
+class Synced(NamedTuple):
+    """The result of syncing a single test file."""
+
+    # The name of the test.
+    filename: str
+    # Information on the annotations collected.
+    info: str
+    # The CPython test file with the annotations applied. None if the RustPython
+    # file has no markers and the CPython file can be copied as is.
+    code: Optional[str]
+    # Time spent collecting and annotating, per stage, see zoot.report.
+    stages: Dict[str, float]
+    # Peak and held memory per stage, if profiling memory.
+    memory: Dict[str, Tuple[int, int]]
+    # The number of function and class decorators collected.
+    decos: Tuple[int, int]
+
+
+def bounded_map(
+    pool: "Executor",
+    budget: int,
+    fn: Callable[["Row"], "Synced"],
+    rows: Iterable["Row"],
+) -> Iterator["Synced"]:
+    """Like `pool.map`, except rows are submitted lazily, only while the memory
+    estimated for the rows in flight fits the budget. At least one row is always
+    in flight, results are yielded in order.
+    """
+    pending: Deque[Tuple["Future", int]] = deque()
+    in_flight = 0
+    rows = iter(rows)
+    row = next(rows, None)
+    while True:
+        while row is not None:
+            cost = MEMORY_FACTOR * row.size
+            if pending and in_flight + cost > budget:
+                break
+            pending.append((pool.submit(fn, row), cost))
+            in_flight += cost
+            row = next(rows, None)
+        if not pending:
+            return
+        future, cost = pending.popleft()
+        in_flight -= cost
+        yield future.result()
+
+
+def has_markers(source: str) -> bool:
+    """Cheap check for any mention of RustPython, files without one can't hold
+    annotations (or comments needing a warning) so they aren't parsed at all.
+    """
+    return "rustpython" in source.lower()
+
+
+def collect_annotations(
+    fname: str,
+    source: str,
+    cache: Optional[AnnotationCache] = None,
+    collector: str = "libcst",
+    timer: Optional[Timer] = None,
+) -> "DecoCollector":
+    """Collect the annotations present in the RustPython file, the parse is
+    skipped if they are found in the cache.
+    """
+    from zoot.annotate import DecoCollector, compact, expand
+    from zoot.scan import ScanCollector
+
+    timer = timer or Timer()
+    collect = (
+        ScanCollector(fname)
+        if collector == "scan"
+        else DecoCollector(fname, prune=True)
+    )
+    entry = None
+    if cache:
+        with timer.stage("cache"):
+            entry = cache.get(fname, source)
+    if entry is None:
+        collect.collect(source, timer)
+        if cache:
+            metas = compact(collect.func_decos, collect.cls_decos)
+            with timer.stage("cache"):
+                cache.put(fname, source, Entry(metas, collect.warnings))
+    else:
+        collect.func_decos, collect.cls_decos = expand(entry.metas)
+        collect.warnings = entry.warnings
+        for warning in entry.warnings:
+            sys.stderr.write(f"{warning}\n")
+    return collect
+
+
+def sync_row(
+    row: "Row",
+    cache: Optional[AnnotationCache] = None,
+    collector: str = "libcst",
+    annotator: str = "libcst",
+    trace: bool = False,
+) -> Synced:
+    """Collect the annotations from the RustPython file and apply them to the
+    CPython file. Defined at module level so it can be sent to worker processes.
+    """
+    timer = Timer(trace)
+    with timer.stage("read"):
+        rustpython_test = _load(row.rustpython_test)
+    if not has_markers(rustpython_test):
+        info = f"No RustPython markers in '{row.filename}', nothing to collect."
+        return Synced(row.filename, info, None, timer.stages, timer.memory, (0, 0))
+    # Read annotations present in the RustPython file:
+    collect = collect_annotations(
+        row.filename, rustpython_test, cache, collector, timer
+    )
+    del rustpython_test
+    # Apply the annotations to the CPython file.
+    from zoot.annotate import DecoAnnotator
+    from zoot.splice import SpliceAnnotator
+
+    annotate = (
+        SpliceAnnotator.from_collector(collect)
+        if annotator == "splice"
+        else DecoAnnotator.from_collector(collect)
+    )
+    with timer.stage("read"):
+        cpython_test = _load(row.cpython_test)
+    code = annotate.annotate(cpython_test, timer)
+    decos = (len(collect.func_decos), len(collect.cls_decos))
+    return Synced(
+        row.filename, collect.info(), code, timer.stages, timer.memory, decos
+    )
+
+
+class Source(NamedTuple):
+    """A test file read only when needed, possibly by a worker process. Either a
+    path on disk or, if rev is set, a path at a revision of the git repository at
+    repo.
+    """
+
+    path: str
+    # Size of the file in bytes.
+    size: int
+    rev: Optional[str] = None
+    repo: Optional[str] = None
+
+    def read(self) -> str:
+        if self.rev is None:
+            with open(self.path, "r") as f:
+                return f.read()
+        obj = _git_objects(self.repo or ".").get(f"{self.rev}:{self.path}")
+        if obj is None or obj[0] != "blob":
+            raise FileNotFoundError(f"No file '{self.path}' at '{self.rev}'")
+        # decode like `open` would, with universal newlines.
+        with io.TextIOWrapper(io.BytesIO(obj[1])) as f:
+            return f.read()
+
+
+# Contents of a test file, given as is or read when needed.
+Text = Union[str, Source]
+
+
 class Row(NamedTuple):
     """A row in the test file."""
 
     # The name of the test.
     filename: str
     # The test file from cpython.
-    cpython_test: str
+    cpython_test: Text
     # The test file from rustpython.
-    rustpython_test: str
-    # The name of the library, if applicable
+    rustpython_test: Text
+    # The name of the library file or package, if applicable. It is copied as is.
     libname: Optional[str]
-    # The library file corresponding to this test file.
-    libfile: Optional[str]
+    # The test package holding the file, if any. Files of a package are committed
+    # together.
+    package: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        """Combined size of the test files."""
+        return _size(self.cpython_test) + _size(self.rustpython_test)
 
 
 class TestLib:
@@ -125,8 +644,22 @@ class TestLib:
     def __init__(self, args: argparse.Namespace) -> None:
         self.cpython_path = Path(args.cpython)
         self.rustpython_path = Path(args.rustpython)
-        self.filenames = self._append_py_suffix(args.filenames)
         self.copy_libs = args.copy_libs
+        # If set, CPython files are read from this commit instead of the work tree.
+        self.ref = args.ref
+        self._objects = _git_objects(str(self.cpython_path)) if self.ref else None
+        # Sizes of the test files at the ref, read along with the first one.
+        self._tree: Optional[Dict[str, TreeEntry]] = None
+        # The commit files are synced from, None if CPython isn't a git repo.
+        self.commit = self.ref or git_resolve(self.cpython_path, "HEAD")
+        self.libindex = self._index_lib(args.lib_map)
+        # Test files found in a single repository when discovering them.
+        self.only_cpython: List[str] = []
+        self.only_rustpython: List[str] = []
+        if args.all:
+            self.filenames = self.discover()
+        else:
+            self.filenames = self._append_py_suffix(args.filenames)
 
     @property
     def cpython_lib(self) -> Path:
@@ -154,50 +687,363 @@ class TestLib:
         contents of it for cpython and rustpython.
         """
         for fname in self.filenames:
-            libname = libfile = None
-            if self.copy_libs:
-                libname = self.find_library(fname)
-                if libname:
-                    libfile = self._read(self.cpython_lib, libname)
+            if self._cpython_is_package(fname):
+                yield from self._package_rows(fname)
+                continue
             yield Row(
                 fname,
-                self._read(self.cpython_testlib, fname),
-                self._read(self.rustpython_testlib, fname),
-                libname,
-                libfile,
+                self._cpython_source(fname),
+                _source(self.rustpython_testlib / fname),
+                self.find_library(fname) if self.copy_libs else None,
             )
 
     def write_to_rustpython(
         self, name: Union[Path, str], content: str, *, lib: bool = False
-    ) -> None:
-        """Write content to rustpython test file."""
+    ) -> bool:
+        """Write content to rustpython test file, unless the file already holds it.
+        Returns whether the file was written.
+        """
         dir = self.rustpython_lib if lib else self.rustpython_testlib
-        with open(dir / name, "w") as f:
-            f.write(content)
+        data = _encode(content)
+        if _holds(dir / name, data):
+            return False
+        (dir / name).parent.mkdir(parents=True, exist_ok=True)
+        with open(dir / name, "wb") as f:
+            f.write(data)
+        return True
+
+    def is_current(self, name: Union[Path, str], content: str) -> bool:
+        """Check if the RustPython test file already holds content."""
+        return _holds(self.rustpython_testlib / name, _encode(content))
+
+    def copy_to_rustpython(self, name: Union[Path, str]) -> bool:
+        """Copy the CPython test file to the RustPython test lib byte for byte,
+        unless they're the same already. Returns whether the file was written.
+        """
+        dest = self.rustpython_testlib / name
+        if self._objects:
+            data = self._cpython_object(Path("test") / name)
+            if _holds(dest, data):
+                return False
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            with open(dest, "wb") as f:
+                f.write(data)
+            return True
+        source = self.cpython_testlib / name
+        if dest.is_file() and filecmp.cmp(source, dest, shallow=False):
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, dest)
+        return True
+
+    def stale_files(self, package: str, keep: Iterable[str]) -> List[str]:
+        """Files of a RustPython test package, relative to the tests, that aren't
+        among those kept, the files of the CPython package.
+        """
+        kept = set(keep)
+        return [
+            f"{package}/{name}"
+            for name in _files(self.rustpython_testlib / package)
+            if f"{package}/{name}" not in kept
+        ]
+
+    def remove_from_rustpython(self, name: Union[Path, str]) -> None:
+        """Remove a RustPython test file, and the directories it leaves empty."""
+        _remove(self.rustpython_testlib / name, self.rustpython_testlib)
 
     def find_library(self, name: str) -> Optional[str]:
         """Given a test name, find if a corresponding library for it exists."""
-        if not name.startswith("test_"):
-            return None
-        name = name[5:]
-        # see if you can find the library in the stdlib
-        if (self.cpython_lib / name).exists():
-            if not (self.cpython_lib / name).is_dir():
-                return name
-            return name
-        return None
-
-    def _read(self, path: Path, name: Union[Path, str]) -> str:
-        """Read file from path."""
-        with open(path / name, "r") as f:
-            return f.read()
+        return self.libindex.resolve(name)
+
+    def _index_lib(self, lib_map: Optional[str]) -> LibIndex:
+        """Index the CPython Lib directory, with the default mapping of test names
+        to libraries extended by the one in the lib_map JSON file.
+        """
+        mapping = dict(LIB_MAP)
+        if lib_map:
+            with open(lib_map, "r") as f:
+                mapping.update(json.load(f))
+        if self._objects:
+            tree = git_ls_tree(self.cpython_path, self.ref, "Lib", recursive=True)
+            return LibIndex(tree, mapping)
+        return LibIndex.from_dir(self.cpython_lib, mapping)
+
+    def copy_lib(self, name: str) -> Tuple[int, int, int]:
+        """Copy a library file or package to the RustPython lib byte for byte,
+        skipping files that already have the same contents and removing those
+        CPython's package doesn't have. Returns the number of files copied, skipped
+        and removed.
+        """
+        if self._objects:
+            return self._copy_lib_objects(name)
+        source, dest = self.cpython_lib / name, self.rustpython_lib / name
+        files = [""] if source.is_file() else self._cpython_files(name)
+        copied = same = 0
+        for fname in files:
+            if (dest / fname).is_file() and filecmp.cmp(
+                source / fname, dest / fname, shallow=False
+            ):
+                same += 1
+                continue
+            (dest / fname).parent.mkdir(parents=True, exist_ok=True)
+            # uses copy_file_range/sendfile where available.
+            shutil.copyfile(source / fname, dest / fname)
+            copied += 1
+        removed = 0 if source.is_file() else self._remove_stale_lib(name, files)
+        return copied, same, removed
+
+    def _copy_lib_objects(self, name: str) -> Tuple[int, int, int]:
+        """Copy a library from the CPython ref, the hashes of the blobs are
+        compared against the files in RustPython before reading them.
+        """
+        path = (CPYTHON_LIB / name).as_posix()
+        obj = self._objects.get(f"{self.ref}:{path}") if self._objects else None
+        if obj is None:
+            raise FileNotFoundError(f"No library '{path}' in CPython at '{self.ref}'")
+        if obj[0] == "blob":
+            blobs = {"": TreeEntry(blob_sha(obj[1]), len(obj[1]))}
+        else:
+            blobs = git_ls_tree(self.cpython_path, self.ref, path, recursive=True)
+        blobs = {
+            fname: blob
+            for fname, blob in blobs.items()
+            if "__pycache__" not in fname.split("/")
+        }
+        copied = same = 0
+        for fname, blob in blobs.items():
+            dest = self.rustpython_lib / name / fname
+            if dest.is_file() and dest.stat().st_size == blob.size:
+                with open(dest, "rb") as f:
+                    if blob_sha(f.read()) == blob.sha:
+                        same += 1
+                        continue
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            with open(dest, "wb") as f:
+                f.write(self._cpython_object(Path(name) / fname))
+            copied += 1
+        removed = 0 if obj[0] == "blob" else self._remove_stale_lib(name, blobs)
+        return copied, same, removed
+
+    def _remove_stale_lib(self, name: str, keep: Iterable[str]) -> int:
+        """Remove the files of a RustPython library package that aren't among
+        those kept, the files of the CPython package. Returns how many were.
+        """
+        kept, dest = set(keep), self.rustpython_lib / name
+        stale = [fname for fname in _files(dest) if fname not in kept]
+        for fname in stale:
+            _remove(dest / fname, self.rustpython_lib)
+        return len(stale)
+
+    def _package_rows(self, package: str) -> Generator:
+        """Rows for every file in a test package, each module is collected and
+        annotated on its own. Files that aren't modules (test data) are given no
+        contents, they are copied as is.
+        """
+        # the library goes along with the first file of the package.
+        libname = self.find_library(package) if self.copy_libs else None
+        for fname in self._cpython_package_files(package):
+            if not fname.endswith(".py"):
+                yield Row(fname, "", "", libname, package)
+                libname = None
+                continue
+            # modules new to the package have nothing to collect.
+            rustpython: Text = ""
+            if (self.rustpython_testlib / fname).exists():
+                rustpython = _source(self.rustpython_testlib / fname)
+            yield Row(fname, self._cpython_source(fname), rustpython, libname, package)
+            libname = None
+
+    def _cpython_package_files(self, package: str) -> List[str]:
+        """Paths of the files in a CPython test package, relative to the tests."""
+        return [
+            f"{package}/{name}" for name in self._cpython_files(Path("test") / package)
+        ]
+
+    def _cpython_files(self, name: Union[Path, str]) -> List[str]:
+        """Paths of the files in a directory under Lib in CPython, relative to it."""
+        if not self._objects:
+            return _files(self.cpython_lib / name)
+        path = (CPYTHON_LIB / name).as_posix()
+        files = list(git_ls_tree(self.cpython_path, self.ref, path, recursive=True))
+        return sorted(f for f in files if "__pycache__" not in f.split("/"))
+
+    def _cpython_is_package(self, name: str) -> bool:
+        """Check if a test name refers to a directory of tests in CPython."""
+        if self._objects:
+            obj = self._objects.get(f"{self.ref}:Lib/test/{name}")
+            return obj is not None and obj[0] == "tree"
+        return (self.cpython_testlib / name).is_dir()
+
+    def discover(self) -> List[str]:
+        """Find the test files and packages present in both repositories, largest
+        first so the big ones don't end up running alone at the end of a parallel
+        sync.
+        """
+        if self.ref:
+            cpython: Dict[str, int] = {}
+            tree = git_ls_tree(self.cpython_path, self.ref, "Lib/test", recursive=True)
+            for path, entry in tree.items():
+                name = path.split("/", 1)[0]
+                if _is_test(name, path != name) and "/__pycache__/" not in path:
+                    cpython[name] = cpython.get(name, 0) + entry.size
+        else:
+            cpython = self._scan(self.cpython_testlib)
+        rustpython = self._scan(self.rustpython_testlib)
+        self.only_cpython = sorted(cpython.keys() - rustpython.keys())
+        self.only_rustpython = sorted(rustpython.keys() - cpython.keys())
+        both = cpython.keys() & rustpython.keys()
+        # both get parsed, the size of both is what matters.
+        return sorted(both, key=lambda name: (-cpython[name] - rustpython[name], name))
+
+    def _scan(self, path: Path) -> Dict[str, int]:
+        """Sizes of the test files and packages in a directory, by name."""
+        sizes = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                if not _is_test(entry.name, entry.is_dir()):
+                    continue
+                if entry.is_dir():
+                    sizes[entry.name] = sum(
+                        p.stat().st_size
+                        for p in Path(entry.path).rglob("*")
+                        if p.is_file() and "__pycache__" not in p.parts
+                    )
+                elif entry.is_file():
+                    sizes[entry.name] = entry.stat().st_size
+        return sizes
+
+    def skip_unchanged(self, state: SyncState) -> List[str]:
+        """Drop the test files for which neither the test nor its library changed
+        in CPython since they were last synced. Returns the names dropped.
+        """
+        if self.commit is None:
+            return []
+        paths = {}
+        for fname in self.filenames:
+            paths[fname] = [(Path("test") / fname).as_posix()]
+            libname = self.find_library(fname) if self.copy_libs else None
+            if libname:
+                paths[fname].append(libname)
+        names = [path for fpaths in paths.values() for path in fpaths]
+        changed = state.changed(self.cpython_path, names, self.commit)
+        keep = [f for f in self.filenames if not changed.isdisjoint(paths[f])]
+        skipped = [f for f in self.filenames if changed.isdisjoint(paths[f])]
+        self.filenames = keep
+        return skipped
+
+    def close(self) -> None:
+        """Release the git processes used for reading CPython files, if any."""
+        _close_git_objects()
+
+    def _cpython_object(self, name: Union[Path, str]) -> bytes:
+        """Grab the contents of a file under Lib at the CPython ref."""
+        assert self._objects is not None
+        path = (CPYTHON_LIB / name).as_posix()
+        obj = self._objects.get(f"{self.ref}:{path}")
+        if obj is None or obj[0] != "blob":
+            raise FileNotFoundError(f"No file '{path}' in CPython at '{self.ref}'")
+        return obj[1]
+
+    def _cpython_source(self, name: str) -> Source:
+        """A test file in CPython, from the work tree or the ref."""
+        if not self._objects:
+            return _source(self.cpython_testlib / name)
+        if self._tree is None:
+            self._tree = git_ls_tree(
+                self.cpython_path, self.ref, "Lib/test", recursive=True
+            )
+        path = (CPYTHON_LIB / "test" / name).as_posix()
+        entry = self._tree.get(name)
+        size = entry.size if entry else 0
+        return Source(path, size, self.ref, str(self.cpython_path))
 
     def _append_py_suffix(self, names: List[str]) -> List[str]:
-        """Append .py suffix to names if not present."""
+        """Append .py suffix to names if not present and not a test package."""
         res, suffix = [], ".py"
         for name in names:
-            if name.endswith(suffix):
+            if name.endswith(suffix) or self._cpython_is_package(name):
                 res.append(name)
             else:
                 res.append(f"{name}{suffix}")
         return res
+
+
+def _counts(counts: Dict[str, int]) -> str:
+    counted = sorted(counts.items())
+    return ", ".join(f"{count} {status}" for status, count in counted) or "no tests"
+
+
+def _is_test(name: str, is_dir: bool) -> bool:
+    """Check if a name in the test directory is a test file or package."""
+    return name.startswith("test_") and (is_dir or name.endswith(".py"))
+
+
+def _files(root: Path) -> List[str]:
+    """Paths of the files under a directory, relative to it, skipping caches."""
+    files = [path.relative_to(root).as_posix() for path in root.rglob("*")]
+    return sorted(
+        f
+        for f in files
+        if "__pycache__" not in f.split("/") and (root / f).is_file()
+    )
+
+
+def _remove(path: Path, root: Path) -> None:
+    """Remove a file, and the directories up to root it leaves empty."""
+    path.unlink()
+    parent = path.parent
+    while parent != root and not any(parent.iterdir()):
+        parent.rmdir()
+        parent = parent.parent
+
+
+def _source(path: Path) -> Source:
+    return Source(str(path), path.stat().st_size)
+
+
+def _load(text: Text) -> str:
+    return text if isinstance(text, str) else text.read()
+
+
+def _size(text: Text) -> int:
+    return len(text) if isinstance(text, str) else text.size
+
+
+# cat-file processes reading files at a ref, by process and repository. Worker
+# processes start their own.
+_objects: Dict[Tuple[int, str], GitObjects] = {}
+
+
+def _git_objects(repo: str) -> GitObjects:
+    key = (os.getpid(), repo)
+    if key not in _objects:
+        _objects[key] = GitObjects(repo)
+    return _objects[key]
+
+
+def _close_git_objects() -> None:
+    pid = os.getpid()
+    for key in [key for key in _objects if key[0] == pid]:
+        _objects.pop(key).close()
+
+
+def _encode(content: str) -> bytes:
+    """Encode text like writing it to a file opened with `open(path, "w")` does."""
+    buffer = io.BytesIO()
+    f = io.TextIOWrapper(buffer)
+    f.write(content)
+    f.flush()
+    data = buffer.getvalue()
+    f.detach()
+    return data
+
+
+def _holds(path: Path, data: bytes) -> bool:
+    """Check if a file holds data, by size and then by hash."""
+    try:
+        if path.stat().st_size != len(data):
+            return False
+    except FileNotFoundError:
+        return False
+    with open(path, "rb") as f:
+        return blob_sha(f.read()) == blob_sha(data)
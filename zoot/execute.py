@@ -0,0 +1,230 @@
+""" Run synced test modules under RustPython and capture the result of every test.
+
+Every module is run as `<interpreter> -m unittest -v test.<module>` from the Lib
+directory of RustPython, in a pool of threads each waiting on one interpreter, and
+the verbose output of unittest is parsed into the status of each test. Any Python
+interpreter can stand in for the RustPython binary.
+"""
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+# Seconds a module may run for before it is killed.
+TIMEOUT = 300
+# Seconds to wait for the rest of the output once it has been killed.
+DRAIN = 10
+# Lines of output kept, shown when the interpreter crashes.
+TAIL = 20
+# Statuses printed by unittest, and what they're recorded as.
+STATUSES = {
+    "ok": "pass",
+    "FAIL": "fail",
+    "ERROR": "error",
+    "skipped": "skip",
+    "expected failure": "xfail",
+    "unexpected success": "xpass",
+}
+# Tests that need a look, xpass ones are marked but no longer fail. Tests that
+# didn't finish are recorded as "timeout" or "crash".
+FAILING = ("fail", "error", "xpass", "timeout", "crash")
+# Exit codes of unittest: 0 if all passed, 1 if any failed, 5 if none ran.
+EXIT_CODES = (0, 1, 5)
+
+# test_foo (test.test_mod.Class.test_foo) ... ok, before 3.11 the test name is
+# not repeated inside the parentheses. Docstrings go on a line of their own.
+_HEAD = re.compile(r"^(\w+) \(([\w.]+)\)(?: \.\.\.(.*))?$")
+#   test_foo (test.test_mod.Class.test_foo) (i=1) ... FAIL
+_SUBTEST = re.compile(r"^  (\w+) \(([\w.]+)\) .* \.\.\. (.*)$")
+# Anything the test printed without a newline comes before the status.
+_STATUS = re.compile(r"(ok|FAIL|ERROR|skipped .*|expected failure|unexpected success)$")
+# Separates the results from the tracebacks of failing tests.
+_SEPARATOR = "=" * 70
+
+
+class ModuleResult(NamedTuple):
+    """The result of running a single test module."""
+
+    # Name of the test file or package, as synced.
+    unit: str
+    # Status of every test, keyed by Class.test_name.
+    tests: Dict[str, str]
+    # None if the module timed out.
+    returncode: Optional[int]
+    # Seconds taken.
+    duration: float
+    # The last lines of the output.
+    tail: str
+
+    @property
+    def timed_out(self) -> bool:
+        return self.returncode is None
+
+    @property
+    def crashed(self) -> bool:
+        """The interpreter died, rather than unittest reporting failures."""
+        return self.returncode not in (None, *EXIT_CODES)
+
+    def counts(self) -> Counter:
+        return Counter(self.tests.values())
+
+    def failing(self) -> List[Tuple[str, str]]:
+        return [(test, s) for test, s in self.tests.items() if s in FAILING]
+
+    def as_dict(self) -> Dict:
+        return {
+            "returncode": self.returncode,
+            "duration": self.duration,
+            "tests": self.tests,
+        }
+
+
+def module_name(unit: str) -> str:
+    """The module to run for a test file or package."""
+    return f"test.{Path(unit).stem}"
+
+
+def _status(text: str) -> Optional[str]:
+    match = _STATUS.search(text)
+    if match is None:
+        return None
+    status = match.group(1)
+    return STATUSES["skipped" if status.startswith("skipped") else status]
+
+
+def _test_id(name: str, where: str, module: str) -> str:
+    """Class.test_name for tests of module, the full name for anything else."""
+    test = where if where.endswith(f".{name}") else f"{where}.{name}"
+    prefix = f"{module}."
+    return test[len(prefix) :] if test.startswith(prefix) else test
+
+
+def _worst(old: Optional[str], new: str) -> str:
+    """A test with subtests fails if any of them does."""
+    if old in FAILING and new not in FAILING:
+        return old
+    return new
+
+
+def parse_verbose(
+    output: str, module: str, unfinished: str = "crash"
+) -> Dict[str, str]:
+    """Status of every test reported in the verbose output of unittest. A test
+    left without a status, when the run was cut short, is recorded as unfinished.
+    """
+    tests: Dict[str, str] = {}
+    # The last test started, while its status hasn't been seen.
+    pending: Optional[str] = None
+    for line in output.splitlines():
+        if line.startswith(_SEPARATOR):
+            break
+        head = _HEAD.match(line)
+        if head:
+            name, where, rest = head.groups()
+            pending = _test_id(name, where, module)
+            status = _status(rest) if rest else None
+            if status:
+                tests[pending] = status
+                pending = None
+            continue
+        subtest = _SUBTEST.match(line)
+        if subtest:
+            name, where, rest = subtest.groups()
+            test = _test_id(name, where, module)
+            status = _status(rest)
+            if status:
+                tests[test] = _worst(tests.get(test), status)
+            continue
+        if pending is None:
+            continue
+        # a docstring, or output of the test, holding the status at its end.
+        status = _status(line.rpartition(" ... ")[2])
+        if status:
+            tests[pending] = _worst(tests.get(pending), status)
+            pending = None
+    if pending is not None and pending not in tests:
+        tests[pending] = unfinished
+    return tests
+
+
+def _kill(proc: subprocess.Popen) -> None:
+    """Kill the interpreter along with anything its tests started."""
+    if sys.platform == "win32":
+        subprocess.run(
+            ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    else:
+        # the interpreter leads its own process group.
+        with suppress(ProcessLookupError):
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def run_module(
+    interpreter: str, cwd: Union[Path, str], unit: str, timeout: float = TIMEOUT
+) -> ModuleResult:
+    """Run the tests of a file or package. On timeout the interpreter is killed,
+    with any process the tests started, since those may hold the output open.
+    """
+    module = module_name(unit)
+    cmd = [interpreter, "-m", "unittest", "-v", module]
+    start = time.perf_counter()
+    with subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+        creationflags=getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0),
+    ) as proc:
+        try:
+            raw, _ = proc.communicate(timeout=timeout)
+            returncode: Optional[int] = proc.returncode
+        except subprocess.TimeoutExpired:
+            returncode = None
+            _kill(proc)
+            try:
+                # whatever was written before the interpreter got killed.
+                raw, _ = proc.communicate(timeout=DRAIN)
+            except subprocess.TimeoutExpired as e:
+                # held open by a process that left the group.
+                raw = e.output or b""
+    duration = time.perf_counter() - start
+    output = raw.decode("utf-8", errors="replace")
+    unfinished = "timeout" if returncode is None else "crash"
+    tests = parse_verbose(output, module, unfinished)
+    tail = "\n".join(output.splitlines()[-TAIL:])
+    return ModuleResult(unit, tests, returncode, duration, tail)
+
+
+def run_modules(
+    interpreter: str,
+    cwd: Union[Path, str],
+    units: Iterable[str],
+    jobs: int = 1,
+    timeout: float = TIMEOUT,
+) -> Iterator[ModuleResult]:
+    """Run the modules, at most `jobs` at a time, results are yielded in order."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(run_module, interpreter, cwd, unit, timeout) for unit in units
+        ]
+        for future in futures:
+            yield future.result()
+
+
+def save_results(path: Union[Path, str], results: Iterable[ModuleResult]) -> None:
+    with open(path, "w") as f:
+        json.dump({r.unit: r.as_dict() for r in results}, f, indent=2)
+        f.write("\n")
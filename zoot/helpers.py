@@ -1,23 +1,138 @@
+import hashlib
 import os
+import stat
 import subprocess
-from typing import List, Union
-from contextlib import AbstractContextManager
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager, suppress
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from pathlib import Path
 
-# copied over from source, so as to not require 3.11 to run the script.
-class chdir(AbstractContextManager):
-    """Non thread-safe context manager to change the current working directory."""
+# Commands that write to a repository (index, refs, work tree) hold this, so they
+# never run concurrently. Reentrant, so a transaction can hold it across several
+# commands, see Git.transaction.
+_WRITE_LOCK = threading.RLock()
+# asyncio locks serializing the writers of every event loop, and the one held by
+# the running task, see Git.atransaction.
+_ASYNC_LOCKS: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+_ASYNC_HELD: ContextVar[Any] = ContextVar("_ASYNC_HELD", default=None)
 
-    def __init__(self, path):
-        self.path = path
-        self._old_cwd = []
 
-    def __enter__(self):
-        self._old_cwd.append(os.getcwd())
-        os.chdir(self.path)
+def blob_sha(content: Union[str, bytes]) -> str:
+    """Hash the content the same way git hashes blob objects."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    sha = hashlib.sha1(b"blob %d\0" % len(content))
+    sha.update(content)
+    return sha.hexdigest()
 
-    def __exit__(self, *excinfo):
-        os.chdir(self._old_cwd.pop())
+
+class Git:
+    """Runs git in a repository, passing the directory to the subprocess instead of
+    changing the working directory of the process.
+
+    Read-only queries (rev-parse, cat-file, diff, ...) can be run concurrently from
+    threads or asyncio tasks, commands that write are serialized.
+    """
+
+    path: Path
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+
+    def _run(self, *args: Union[str, Path]) -> str:
+        out = subprocess.check_output(["git", *args], cwd=self.path)
+        return out.decode("utf-8").strip()
+
+    def query(self, *args: Union[str, Path]) -> str:
+        """Run a read-only git command, returning its output."""
+        return self._run(*args)
+
+    def write(self, *args: Union[str, Path]) -> str:
+        """Run a git command that writes to the repository."""
+        with _WRITE_LOCK:
+            return self._run(*args)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Hold the write lock across several commands, nothing else writes to the
+        repository in between (e.g. stages files while a commit is being made).
+        """
+        with _WRITE_LOCK:
+            yield
+
+    async def _arun(self, *args: Union[str, Path]) -> str:
+        # already loaded if there's an event loop, not worth it for the others.
+        import asyncio
+
+        cmd = ["git", *args]
+
+        async def run() -> str:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, cwd=self.path, stdout=subprocess.PIPE
+            )
+            out, _ = await proc.communicate()
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, cmd, out)
+            return out.decode("utf-8").strip()
+
+        done = asyncio.ensure_future(run())
+        try:
+            return await asyncio.shield(done)
+        except asyncio.CancelledError:
+            # git is left to finish, a transaction isn't over while it still runs.
+            while not done.done():
+                with suppress(asyncio.CancelledError):
+                    await asyncio.wait([done])
+            if not done.cancelled():
+                # retrieved, git failing doesn't matter once cancelled.
+                done.exception()
+            raise
+
+    async def aquery(self, *args: Union[str, Path]) -> str:
+        """Like query, without blocking the event loop."""
+        return await self._arun(*args)
+
+    async def awrite(self, *args: Union[str, Path]) -> str:
+        """Like write, without blocking the event loop."""
+        async with self.atransaction():
+            return await self._arun(*args)
+
+    @asynccontextmanager
+    async def atransaction(self) -> AsyncIterator[None]:
+        """Like transaction, for the tasks of an event loop. They queue on an
+        asyncio.Lock rather than block the loop on the write lock, a repository is
+        written either from threads or from an event loop, not both at once.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        lock = _ASYNC_LOCKS.get(loop)
+        if lock is None:
+            # created within the loop, for python < 3.10.
+            lock = _ASYNC_LOCKS[loop] = asyncio.Lock()
+        if _ASYNC_HELD.get() is lock:
+            # awrite within a transaction.
+            yield
+            return
+        async with lock:
+            token = _ASYNC_HELD.set(lock)
+            try:
+                yield
+            finally:
+                _ASYNC_HELD.reset(token)
 
 
 # A couple of very basic helpers for calling git,
@@ -26,13 +141,13 @@ class chdir(AbstractContextManager):
 
 def git_add(filename: Union[Path, str], path: Union[Path, str]):
     """Add a file to git."""
-    _run_in_dir(["git", "add", filename], path)
+    Git(path).write("add", filename)
 
 
 def git_commit(filename: Union[Path, str], path: Union[Path, str], msg: str):
     """Commit a file to git."""
     try:
-        _run_in_dir(["git", "commit", "-m", msg], path)
+        Git(path).write("commit", "-m", msg)
     except subprocess.CalledProcessError:
         # restore the file if the commit fails
         git_restore(filename, path, staged=True)
@@ -40,8 +155,10 @@ def git_commit(filename: Union[Path, str], path: Union[Path, str], msg: str):
 
 def git_add_commit(filename: Union[Path, str], path: Union[Path, str], msg: str):
     """Add and commit a file to git."""
-    git_add(filename, path)
-    git_commit(filename, path, msg)
+    # nothing else may be staged in between.
+    with Git(path).transaction():
+        git_add(filename, path)
+        git_commit(filename, path, msg)
 
 
 def git_exists() -> bool:
@@ -58,12 +175,10 @@ def git_restore(
 ) -> bool:
     """Roll back any changes made if a failure was detected."""
     try:
-        cmd = (
-            ["git", "restore", "--staged", filename]
-            if staged
-            else ["git", "restore", filename]
-        )
-        _run_in_dir(cmd, path)
+        if staged:
+            Git(path).write("restore", "--staged", filename)
+        else:
+            Git(path).write("restore", filename)
     except subprocess.CalledProcessError:
         return False
     return True
@@ -78,20 +193,219 @@ def git_diff(first: Path, second: Path) -> str:
 
 def git_checkout(path: Union[str, Path], branch: str):
     """Checkout a branch."""
-    _run_in_dir(["git", "checkout", "-b", branch], path)
+    Git(path).write("checkout", "-b", branch)
+
+
+def git_resolve(path: Union[str, Path], ref: str) -> Optional[str]:
+    """Resolve a ref (branch, tag, sha) to the hash of the commit it points to."""
+    try:
+        return Git(path).query("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}")
+    except subprocess.CalledProcessError:
+        return None
+
+
+def git_changed_files(
+    path: Union[str, Path], old: str, new: str, directory: str
+) -> List[str]:
+    """Names of the files under directory that differ between two commits,
+    relative to that directory.
+    """
+    out = Git(path).query(
+        "diff", "--name-only", "--no-renames", old, new, "--", directory
+    )
+    prefix = f"{directory}/"
+    return [name[len(prefix) :] for name in out.splitlines()]
+
+
+class TreeEntry(NamedTuple):
+    """A blob listed by `git ls-tree`."""
+
+    sha: str
+    size: int
+
+
+def git_ls_tree(
+    path: Union[str, Path], ref: str, directory: str, recursive: bool = False
+) -> Dict[str, TreeEntry]:
+    """The blobs under directory at ref, by path relative to it."""
+    args = ["ls-tree", "-l", "-z", ref, f"{directory}/"]
+    if recursive:
+        args.insert(1, "-r")
+    prefix = f"{directory}/"
+    blobs = {}
+    for entry in Git(path).query(*args).split("\0"):
+        if not entry:
+            continue
+        info, name = entry.split("\t", 1)
+        _, kind, sha, size = info.split()
+        if kind == "blob":
+            blobs[name[len(prefix) :]] = TreeEntry(sha, int(size))
+    return blobs
 
 
 def cpython_branch(path: Path) -> str:
     """Grab the branch of cpython."""
-    with chdir(path):
-        return (
-            subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"])
-            .decode("utf-8")
-            .strip()
+    return Git(path).query("rev-parse", "--abbrev-ref", "HEAD")
+
+
+class GitObjects:
+    """Read objects through a single long-lived `git cat-file --batch` process,
+    instead of checking out a tree and opening every file. Safe to share between
+    threads, requests are answered one at a time.
+    """
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self._lock = threading.Lock()
+        self._proc = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def get(self, rev: str) -> Optional[Tuple[str, bytes]]:
+        """Grab the type and contents of an object, e.g. `3.11:Lib/string.py`.
+        Returns None if the object doesn't exist.
+        """
+        stdin, stdout = self._proc.stdin, self._proc.stdout
+        assert stdin is not None and stdout is not None
+        with self._lock:
+            stdin.write(rev.encode("utf-8") + b"\n")
+            stdin.flush()
+            header = stdout.readline().rstrip(b"\n")
+            if header.endswith((b" missing", b" ambiguous")):
+                return None
+            _, kind, size = header.split()
+            content = stdout.read(int(size))
+            # contents are followed by a newline.
+            stdout.read(1)
+        return kind.decode("utf-8"), content
+
+    def close(self) -> None:
+        """Stop the cat-file process."""
+        if self._proc.stdin:
+            self._proc.stdin.close()
+        self._proc.wait()
+
+
+def _file_mode(path: Path) -> bytes:
+    """The mode git adds a file with, executable or not."""
+    if os.stat(path).st_mode & stat.S_IXUSR:
+        return b"100755"
+    return b"100644"
+
+
+class GitBatch:
+    """Stream commits to a single `git fast-import` process instead of spawning
+    `git add`/`git commit` for every file.
+
+    Files are staged with `add`, which grabs their current contents, and `commit`
+    turns everything staged into a commit on top of the checked out branch. The
+    branch is only updated by `close`, after which the index is reset for the
+    paths touched so `git status` matches the new HEAD.
+    """
+
+    path: Path
+    commits: int
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        self.commits = 0
+        # None for files removed.
+        self._staged: Dict[str, Optional[bytes]] = {}
+        # blob hashes of the files as of HEAD, updated as commits are made.
+        self._committed: Dict[str, str] = {}
+        # modes of the files, as of HEAD or from the work tree for new ones.
+        self._modes: Dict[str, bytes] = {}
+        self._touched: Set[str] = set()
+        self._proc: Optional[subprocess.Popen] = None
+
+    def _start(self) -> None:
+        """Grab what's needed for the commits and start fast-import."""
+        git = Git(self.path)
+        # paths in the stream are relative to the root of the repository.
+        self._root = git.query("rev-parse", "--show-toplevel")
+        self._prefix = git.query("rev-parse", "--show-prefix")
+        self._header = b"commit %s\nauthor %s\ncommitter %s\n" % tuple(
+            git.query(*args).encode("utf-8")
+            for args in (
+                ("symbolic-ref", "HEAD"),
+                ("var", "GIT_AUTHOR_IDENT"),
+                ("var", "GIT_COMMITTER_IDENT"),
+            )
         )
+        self._parent = git.query("rev-parse", "HEAD")
+        tree = git.query("ls-tree", "-r", "--full-name", "HEAD")
+        for entry in tree.splitlines():
+            info, name = entry.split("\t", 1)
+            mode, _, sha = info.split()
+            self._committed[name] = sha
+            self._modes[name] = mode.encode("ascii")
+        self._proc = subprocess.Popen(
+            ["git", "fast-import", "--quiet", "--done"],
+            cwd=self._root,
+            stdin=subprocess.PIPE,
+        )
+
+    def add(self, filename: Union[Path, str]) -> None:
+        """Stage the current contents of a file, or its removal if it's gone."""
+        if self._proc is None:
+            self._start()
+        name = self._prefix + Path(filename).as_posix()
+        try:
+            with open(self.path / filename, "rb") as f:
+                content: Optional[bytes] = f.read()
+        except FileNotFoundError:
+            content = None
+        if content is not None and name not in self._modes:
+            self._modes[name] = _file_mode(self.path / filename)
+        committed = self._committed.get(name)
+        if committed == (None if content is None else blob_sha(content)):
+            # unchanged since it was last committed, nothing to stage.
+            self._staged.pop(name, None)
+            return
+        self._staged[name] = content
 
+    def commit(self, msg: str) -> None:
+        """Commit the staged files, nothing is done if none are staged."""
+        if not self._staged:
+            return
+        assert self._proc is not None and self._proc.stdin is not None
+        stream = self._proc.stdin
+        data = msg.encode("utf-8")
+        stream.write(self._header)
+        stream.write(b"data %d\n%s\n" % (len(data), data))
+        if self.commits == 0:
+            stream.write(b"from %s\n" % self._parent.encode("utf-8"))
+        for name, content in self._staged.items():
+            if content is None:
+                stream.write(b"D %s\n" % name.encode("utf-8"))
+                continue
+            mode = self._modes[name]
+            stream.write(b"M %s inline %s\n" % (mode, name.encode("utf-8")))
+            stream.write(b"data %d\n%s\n" % (len(content), content))
+        stream.write(b"\n")
+        for name, content in self._staged.items():
+            if content is None:
+                self._committed.pop(name, None)
+                self._modes.pop(name, None)
+            else:
+                self._committed[name] = blob_sha(content)
+        self._touched.update(self._staged)
+        self._staged.clear()
+        self.commits += 1
 
-def _run_in_dir(cmd: List[Union[str, Path]], path: Union[str, Path]) -> str:
-    """Run a command in a directory."""
-    with chdir(path):
-        return subprocess.check_output(cmd).decode("utf-8").strip()
+    def close(self) -> None:
+        """Finish the stream, which updates the branch, and sync the index."""
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        assert proc.stdin is not None
+        # the branch is updated when fast-import is done.
+        with _WRITE_LOCK:
+            proc.stdin.write(b"done\n")
+            proc.stdin.close()
+            if proc.wait():
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
+            if self._touched:
+                Git(self._root)._run("reset", "-q", "--", *sorted(self._touched))
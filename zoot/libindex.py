@@ -0,0 +1,92 @@
+""" Index of the files in CPython's Lib, used to find the library a test covers.
+
+The index is built once, from a single walk of the directory or a single
+`git ls-tree`, after which resolving a test name costs no filesystem calls.
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+# Test names (without a .py suffix) to library paths relative to Lib, for tests
+# the naming rules in LibIndex.resolve don't handle. None means no library.
+LIB_MAP: Dict[str, Optional[str]] = {
+    "test_minidom": "xml/dom/minidom.py",
+    "test_pulldom": "xml/dom/pulldom.py",
+    "test_robotparser": "urllib/robotparser.py",
+    "test_sax": "xml/sax",
+    "test_urllib2": "urllib/request.py",
+    "test_urlparse": "urllib/parse.py",
+    "test_xml_etree_c": "xml/etree",
+}
+
+
+class LibIndex:
+    """The files and directories under Lib, excluding the tests."""
+
+    files: Set[str]
+    dirs: Set[str]
+    mapping: Dict[str, Optional[str]]
+
+    def __init__(
+        self, paths: Iterable[str], mapping: Optional[Dict[str, Optional[str]]] = None
+    ) -> None:
+        self.files, self.dirs = set(), set()
+        for path in paths:
+            parts = path.split("/")
+            if parts[0] == "test" or "__pycache__" in parts:
+                continue
+            self.files.add(path)
+            self.dirs.update("/".join(parts[:i]) for i in range(1, len(parts)))
+        self.mapping = LIB_MAP if mapping is None else mapping
+
+    @classmethod
+    def from_dir(
+        cls, lib: Union[Path, str], mapping: Optional[Dict[str, Optional[str]]] = None
+    ) -> "LibIndex":
+        """Index a Lib directory on disk."""
+        return cls(_walk(str(lib), ""), mapping)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.files or path in self.dirs
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Find the library, a module or a package, covered by a test. In order:
+
+        1. The mapping table.
+        2. The name without the `test_` prefix, `test_os.py` -> `os.py`,
+           `test_json` -> `json`, modules are tried before packages.
+        3. The same, with an underscore standing for a package separator,
+           `test_http_cookies.py` -> `http/cookies.py`.
+        """
+        stem = name[:-3] if name.endswith(".py") else name
+        if stem in self.mapping:
+            path = self.mapping[stem]
+            return path if path is None or path in self else None
+        if not stem.startswith("test_"):
+            return None
+        stem = stem[5:]
+        candidates = [stem]
+        parts = stem.split("_")
+        for i in range(1, len(parts)):
+            candidates.append(f"{'_'.join(parts[:i])}/{'_'.join(parts[i:])}")
+        for candidate in candidates:
+            # modules before packages.
+            if f"{candidate}.py" in self.files:
+                return f"{candidate}.py"
+            if candidate in self.dirs:
+                return candidate
+        return None
+
+
+def _walk(root: str, prefix: str) -> List[str]:
+    """Paths of the files under root, relative to it, skipping the tests."""
+    paths = []
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.name == "__pycache__" or (not prefix and entry.name == "test"):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                paths.extend(_walk(entry.path, f"{prefix}{entry.name}/"))
+            else:
+                paths.append(f"{prefix}{entry.name}")
+    return paths
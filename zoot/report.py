@@ -0,0 +1,225 @@
+""" Timings of the stages of a sync, per file and for the whole run.
+
+Stages are timed with a monotonic clock. Work done in worker processes (collecting
+and annotating) is timed there and shipped back along with the result, the rest
+(reading, writing and running git) is timed by the driver. Time spent in git for
+a test package is recorded under the name of the package.
+
+When profiling memory, the memory allocated by every stage is traced with
+`tracemalloc`: the peak above what was allocated when the stage started and what
+was still held when it ended. Figures are per process, stages running in threads
+(as with the asyncio driver) count each other's allocations.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+# Number of files listed as the slowest, or allocating the most, in the report.
+SLOWEST = 10
+
+
+class Timer:
+    """Accumulates the time spent in named stages, in seconds, and the memory
+    allocated in them, in bytes, if tracing memory.
+    """
+
+    stages: Dict[str, float]
+    # Peak and held memory per stage, peaks are the largest seen, held memory adds
+    # up.
+    memory: Dict[str, Tuple[int, int]]
+    trace: bool
+
+    def __init__(self, trace: bool = False) -> None:
+        self.stages = {}
+        self.memory = {}
+        self.trace = trace
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.trace:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if self.trace:
+                current, peak = tracemalloc.get_traced_memory()
+                self.add_memory(name, peak - base, current - base)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_memory(self, name: str, peak: int, held: int) -> None:
+        old_peak, old_held = self.memory.get(name, (0, 0))
+        self.memory[name] = (max(old_peak, peak), old_held + held)
+
+    def merge(
+        self,
+        stages: Dict[str, float],
+        memory: Optional[Dict[str, Tuple[int, int]]] = None,
+    ) -> None:
+        for name, seconds in stages.items():
+            self.add(name, seconds)
+        for name, (peak, held) in (memory or {}).items():
+            self.add_memory(name, peak, held)
+
+    @property
+    def total(self) -> float:
+        return sum(self.stages.values())
+
+
+class FileReport(Timer):
+    """The stages of a single file, along with what was processed."""
+
+    # Size of the CPython and RustPython files read, in bytes.
+    bytes: int
+    func_decos: int
+    cls_decos: int
+
+    def __init__(self, trace: bool = False) -> None:
+        super().__init__(trace)
+        self.bytes = self.func_decos = self.cls_decos = 0
+
+    @property
+    def peak(self) -> int:
+        """The largest peak of all stages."""
+        return max((peak for peak, _ in self.memory.values()), default=0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {
+            "stages": self.stages,
+            "total": self.total,
+            "bytes": self.bytes,
+            "function_decorators": self.func_decos,
+            "class_decorators": self.cls_decos,
+        }
+        if self.memory:
+            data["memory"] = {
+                name: {"peak": peak, "held": held}
+                for name, (peak, held) in self.memory.items()
+            }
+        return data
+
+
+class Report:
+    """Timings of a run, written out as JSON."""
+
+    files: Dict[str, FileReport]
+    # Stages not tied to a file, like checking out the branch.
+    run: Timer
+
+    def __init__(self, trace: bool = False) -> None:
+        self.files = {}
+        self.trace = trace
+        self.run = Timer(trace)
+        self._start = time.perf_counter()
+
+    def file(self, name: str) -> FileReport:
+        if name not in self.files:
+            self.files[name] = FileReport(self.trace)
+        return self.files[name]
+
+    @contextmanager
+    def stage(self, name: Optional[str], stage: str) -> Iterator[None]:
+        """Time a stage of the given file, or of the run if name is None."""
+        timer = self.run if name is None else self.file(name)
+        with timer.stage(stage):
+            yield
+
+    def aggregate(self) -> Dict[str, Any]:
+        """Totals over all files, per stage and overall."""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for name, report in self.files.items():
+            for stage, seconds in report.stages.items():
+                agg = stages.setdefault(stage, {"total": 0.0, "files": 0})
+                agg["total"] += seconds
+                agg["files"] += 1
+                if seconds > agg.get("max", -1.0):
+                    agg["max"], agg["max_file"] = seconds, name
+        for agg in stages.values():
+            agg["mean"] = agg["total"] / agg["files"]
+        slowest = sorted(self.files, key=lambda n: self.files[n].total, reverse=True)
+        agg = {
+            "wall": time.perf_counter() - self._start,
+            "files": len(self.files),
+            "bytes": sum(report.bytes for report in self.files.values()),
+            "function_decorators": sum(r.func_decos for r in self.files.values()),
+            "class_decorators": sum(r.cls_decos for r in self.files.values()),
+            "stages": stages,
+            "run": self.run.stages,
+            "slowest": [
+                {"file": name, "total": self.files[name].total}
+                for name in slowest[:SLOWEST]
+            ],
+        }
+        if self.trace:
+            agg["memory"] = self.aggregate_memory()
+        return agg
+
+    def aggregate_memory(self) -> Dict[str, Any]:
+        """The largest peak of every stage and the files allocating the most."""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for name, report in self.files.items():
+            for stage, (peak, held) in report.memory.items():
+                agg = stages.setdefault(stage, {"peak": -1, "held": 0})
+                agg["held"] += held
+                if peak > agg["peak"]:
+                    agg["peak"], agg["peak_file"] = peak, name
+        top = sorted(self.files, key=lambda n: self.files[n].peak, reverse=True)
+        return {
+            "stages": stages,
+            "run": {
+                name: {"peak": peak, "held": held}
+                for name, (peak, held) in self.run.memory.items()
+            },
+            "top": [
+                {"file": name, "peak": self.files[name].peak}
+                for name in top[:SLOWEST]
+            ],
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "aggregate": self.aggregate(),
+            "files": {name: report.as_dict() for name, report in self.files.items()},
+        }
+
+    def save(self, path: Union[Path, str]) -> None:
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+            f.write("\n")
+
+    def summary(self) -> List[str]:
+        """Lines giving the total time spent in each stage, slowest first."""
+        agg = self.aggregate()
+        totals = {stage: a["total"] for stage, a in agg["stages"].items()}
+        totals.update(agg["run"])
+        return [
+            f"{stage:<16}{seconds:10.3f}s"
+            for stage, seconds in sorted(totals.items(), key=lambda t: -t[1])
+        ]
+
+    def memory_summary(self) -> List[str]:
+        """Lines giving the largest peak of each stage and the files with the
+        largest peaks.
+        """
+        agg = self.aggregate_memory()
+        peaks = sorted(agg["stages"].items(), key=lambda t: -t[1]["peak"])
+        lines = [
+            f"{stage:<16}{_mib(a['peak']):>10} in '{a['peak_file']}'"
+            for stage, a in peaks
+        ]
+        lines.append("Top allocating files:")
+        lines.extend(f"{_mib(t['peak']):>10} {t['file']}" for t in agg["top"])
+        return lines
+
+
+def _mib(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f}MiB"
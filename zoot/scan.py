@@ -0,0 +1,411 @@
+""" Lightweight alternative to DecoCollector built on `ast` and `tokenize`.
+
+The structure of the file is taken from `ast`, the decorators and comments are
+sliced straight out of the source. Ownership of comments (which statement they
+belong to) follows the rules libcst uses, whenever these can't be decided from
+the source alone the file is handed over to the libcst traversal.
+"""
+import ast
+import io
+import tokenize
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import libcst
+
+from zoot.annotate import (
+    COMPACT_INDENT,
+    CompactMeta,
+    DecoCollector,
+    expand,
+    _ATTR_NAMES,
+)
+from zoot.report import Timer
+
+NEEDLE = "rustpython"
+
+# Statements holding blocks of statements, TryStar and Match depend on the version.
+_COMPOUND = tuple(
+    getattr(ast, name)
+    for name in (
+        "FunctionDef",
+        "AsyncFunctionDef",
+        "ClassDef",
+        "If",
+        "For",
+        "AsyncFor",
+        "While",
+        "With",
+        "AsyncWith",
+        "Try",
+        "TryStar",
+        "Match",
+    )
+    if hasattr(ast, name)
+)
+# Fields holding blocks in the order libcst visits them.
+_BLOCKS = ("body", "handlers", "orelse", "finalbody", "cases")
+Def = Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef]
+
+
+class Ambiguous(Exception):
+    """Raised for source that can't be handled without libcst."""
+
+
+class ScanCollector(DecoCollector):
+    """Collects the same decorators as DecoCollector without building a CST,
+    falling back to it for ambiguous constructs.
+    """
+
+    # Why the libcst traversal was used, if it was.
+    fallback: Optional[str]
+
+    def __init__(self, fname: Optional[str] = None):
+        super().__init__(fname, prune=True)
+        self.fallback = None
+
+    def collect(self, source: str, timer: Optional[Timer] = None) -> None:
+        timer = timer or Timer()
+        try:
+            with timer.stage("collect-parse"):
+                scanner = _Scanner(source)
+            with timer.stage("collect-visit"):
+                scanner.scan()
+        except Ambiguous as e:
+            self.fallback = str(e)
+            self.clear()
+            super().collect(source, timer)
+            return
+        self.func_decos, self.cls_decos = expand(scanner.metas)
+        for cls_name, func_name, comment in scanner.stray:
+            self.current_class_name = cls_name
+            self.current_func_name = func_name
+            self._check_comment(libcst.Comment(comment))
+
+
+class _Scanner:
+    """Does the actual work for ScanCollector. Line numbers are 1-based, like
+    the ones used by ast.
+    """
+
+    source: str
+    lines: List[str]
+    # Collected decorators, in the order DecoCollector visits them.
+    metas: List[CompactMeta]
+    # Comments needing a warning, with the class/function names DecoCollector
+    # would have at that point.
+    stray: List[Tuple[str, str, str]]
+
+    def __init__(self, source: str) -> None:
+        if "\r" in source or "\f" in source:
+            raise Ambiguous("source contains carriage returns or form feeds")
+        try:
+            self.tree = ast.parse(source)
+        except SyntaxError as e:
+            raise Ambiguous(f"ast can't parse the source: {e}")
+        self.source = source
+        self.lines = source.split("\n")
+        self.metas = []
+        self.stray = []
+        # lines mentioning rustpython and the ones we know aren't stray comments.
+        self.marked = {
+            i for i, line in enumerate(source.lower().split("\n"), 1) if NEEDLE in line
+        }
+        self.handled: Set[int] = set()
+        # the first line of statements, for decorated statements, the first
+        # decorator, and the previous statement in the same block.
+        self.starts: Dict[int, ast.stmt] = {}
+        self.prev: Dict[ast.stmt, Optional[ast.stmt]] = {}
+        # simple statements covering each line.
+        self.cover: Dict[int, List[ast.stmt]] = {}
+        # (first line, is class, name) for definitions DecoCollector visits.
+        self.events: List[Tuple[int, bool, str]] = []
+        self.class_name = ""
+        self.header: Optional[ast.stmt] = None
+
+    def scan(self) -> None:
+        self._walk(self.tree.body, None, False)
+        stray = sorted(self.marked - self.handled)
+        if stray:
+            self._find_stray(set(stray))
+
+    # Structure
+
+    def _walk(
+        self, body: Sequence[ast.stmt], parent: Optional[ast.AST], in_class: bool
+    ) -> None:
+        """Walk the block, in_class signals that we're inside a class with bases."""
+        prev = None
+        for stmt in body:
+            self.prev[stmt] = prev
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = _start(stmt)
+                self.starts[start] = stmt
+                gap = self._gap(start, prev, parent)
+                self.handled.update(gap)
+                self.handled.update(range(start, stmt.lineno))
+                if isinstance(stmt, ast.ClassDef):
+                    if stmt.bases:
+                        self.class_name = stmt.name
+                        self.events.append((start, True, stmt.name))
+                        self._collect(stmt, stmt.name, gap, prev, parent)
+                    self._walk(stmt.body, stmt, in_class or bool(stmt.bases))
+                else:
+                    if in_class:
+                        self.events.append((start, False, stmt.name))
+                        target = f"{self.class_name}.{stmt.name}"
+                        self._collect(stmt, target, gap, prev, parent)
+                    self._walk(stmt.body, stmt, in_class)
+            elif isinstance(stmt, _COMPOUND):
+                self.starts[stmt.lineno] = stmt
+                for field in _BLOCKS:
+                    for node in getattr(stmt, field, ()):
+                        if isinstance(node, ast.stmt):
+                            self._walk([node], stmt, in_class)
+                        else:
+                            # except handlers and match cases.
+                            self._walk(node.body, node, in_class)
+            else:
+                self.starts.setdefault(stmt.lineno, stmt)
+                for line in range(stmt.lineno, stmt.end_lineno + 1):  # type: ignore
+                    self.cover.setdefault(line, []).append(stmt)
+                if parent is None and prev is None:
+                    # comments preceding it end up in the header of the module.
+                    self.header = stmt
+            prev = stmt
+
+    def _gap(
+        self, start: int, prev: Optional[ast.stmt], parent: Optional[ast.AST]
+    ) -> range:
+        """Blank and comment lines preceding a statement starting at start."""
+        if prev is not None:
+            low = prev.end_lineno + 1  # type: ignore
+        else:
+            low = parent.lineno + 1 if parent is not None else 1  # type: ignore
+        line = start - 1
+        while line >= low and self._is_empty(line):
+            line -= 1
+        return range(line + 1, start)
+
+    # Collection
+
+    def _collect(
+        self,
+        node: Def,
+        target: str,
+        gap: range,
+        prev: Optional[ast.stmt],
+        parent: Optional[ast.AST],
+    ) -> None:
+        """Collect the decorators of node, see DecoCollector.visit_FunctionDef."""
+        if not node.decorator_list:
+            return
+        indent = _indent(self.lines[_start(node) - 1])
+        comments = [line for line in gap if self._is_marked_comment(line)]
+        if comments:
+            if prev is None and parent is None:
+                raise Ambiguous("comments in the header of the module")
+            if isinstance(prev, _COMPOUND) and any(
+                _indent(self.lines[line - 1]) != indent for line in comments
+            ):
+                raise Ambiguous(f"comments before line {node.lineno} could be a footer")
+        decos = []
+        prev_end = 0
+        for deco in node.decorator_list:
+            if self._text(deco.lineno, 0, deco.col_offset).strip() != "@":
+                raise Ambiguous(f"decorator on line {deco.lineno}")
+            first = prev_end + 1 if prev_end else deco.lineno
+            lead = range(first, deco.lineno)
+            if not all(self._is_empty(line) for line in lead):
+                raise Ambiguous(f"decorator on line {deco.lineno}")
+            tail = self._text(deco.end_lineno, deco.end_col_offset)  # type: ignore
+            tail = tail.strip()
+            if tail and not tail.startswith("#"):
+                raise Ambiguous(f"decorator on line {deco.lineno}")
+            has_comment = bool(comments) or any(
+                self._is_marked_comment(line) for line in lead
+            )
+            if self._rustpython_deco(deco, has_comment):
+                self._check_multiline(deco)
+                last: int = deco.end_lineno  # type: ignore
+                decos.append(self._render(range(first, last + 1), indent))
+            prev_end = deco.end_lineno  # type: ignore
+        if decos:
+            leading = [self._render([line], indent) for line in comments]
+            self.metas.append(CompactMeta(target, decos, leading))
+
+    def _rustpython_deco(self, deco: ast.expr, has_comment: bool) -> bool:
+        """Mirrors annotate.rustpython_deco."""
+        if isinstance(deco, ast.Call):
+            func = deco.func
+            if not isinstance(func, ast.Attribute) or not self._unittest_attr(func):
+                return False
+            args = sorted(
+                [*deco.args, *(kw.value for kw in deco.keywords)],
+                key=lambda arg: (arg.lineno, arg.col_offset),
+            )
+            for arg in args:
+                if isinstance(arg, ast.Starred):
+                    arg = arg.value
+                if NEEDLE in self._arg_value(arg).lower():
+                    return True
+            return False
+        if isinstance(deco, ast.Attribute) and has_comment:
+            return self._unittest_attr(deco)
+        return False
+
+    def _unittest_attr(self, attr: ast.Attribute) -> bool:
+        """Mirrors annotate._rustpython_deco_attr."""
+        value = attr.value
+        if isinstance(value, ast.Name):
+            return value.id == "unittest" and attr.attr in _ATTR_NAMES
+        if isinstance(value, (ast.Attribute, ast.Subscript)):
+            return False
+        raise Ambiguous(f"decorator on line {attr.lineno}")
+
+    def _arg_value(self, arg: ast.expr) -> str:
+        """The value libcst holds for the argument of a decorator."""
+        if isinstance(arg, ast.Name):
+            return arg.id
+        if isinstance(arg, ast.Constant) and arg.value is not Ellipsis:
+            text = self._text(
+                arg.lineno, arg.col_offset, arg.end_col_offset, arg.end_lineno
+            )
+            if isinstance(arg.value, (str, bytes)) and not _is_single_string(text):
+                raise Ambiguous(f"concatenated string on line {arg.lineno}")
+            return text
+        raise Ambiguous(f"decorator argument on line {arg.lineno}")
+
+    def _check_multiline(self, deco: ast.expr) -> None:
+        """Continuation lines are only reproduced for bracketed expressions."""
+        for line in range(deco.lineno, deco.end_lineno):  # type: ignore
+            if self.lines[line - 1].rstrip().endswith("\\"):
+                raise Ambiguous(f"line continuation on line {line}")
+        for node in ast.walk(deco):
+            if isinstance(node, (ast.Constant, ast.JoinedStr)):
+                if node.lineno != node.end_lineno:
+                    raise Ambiguous(f"multi-line string on line {node.lineno}")
+
+    def _render(self, lines: Sequence[int], indent: str) -> str:
+        """Render the lines like CompactMeta does."""
+        res = []
+        for line in lines:
+            text = self.lines[line - 1]
+            if "\t" in text:
+                raise Ambiguous(f"tab on line {line}")
+            if text.startswith(indent):
+                text = COMPACT_INDENT + text[len(indent) :]
+            res.append(f"{text}\n")
+        return "".join(res)
+
+    # Stray comments
+
+    def _find_stray(self, marked: Set[int]) -> None:
+        """Find the comments DecoCollector warns about, mirroring visit_Comment:
+        comments inside a simple statement line, including the ones preceding it.
+        """
+        events = iter(self.events)
+        event = next(events, None)
+        cls_name = func_name = ""
+        for line, col, comment in self._comments(marked):
+            while event is not None and event[0] < line:
+                if event[1]:
+                    cls_name = event[2]
+                else:
+                    func_name = event[2]
+                event = next(events, None)
+            if self._is_stray(line, col):
+                self.stray.append((cls_name, func_name, comment))
+
+    def _comments(self, lines: Set[int]) -> List[Tuple[int, int, str]]:
+        """Comments mentioning rustpython found on the given lines."""
+        res = []
+        try:
+            tokens = tokenize.generate_tokens(io.StringIO(self.source).readline)
+            for tok in tokens:
+                if tok.type == tokenize.COMMENT and tok.start[0] in lines:
+                    if NEEDLE in tok.string.lower():
+                        res.append((tok.start[0], tok.start[1], tok.string))
+        except (tokenize.TokenError, SyntaxError) as e:
+            raise Ambiguous(f"tokenize failed: {e}")
+        return res
+
+    def _is_stray(self, line: int, col: int) -> bool:
+        covering = self.cover.get(line)
+        if covering:
+            if any(self._is_line_start(stmt) for stmt in covering):
+                return True
+            raise Ambiguous(f"comment in a one line block on line {line}")
+        if self.lines[line - 1][:col].strip():
+            # trailing a header (def, if, else, ...).
+            return False
+        low = high = line
+        while low > 1 and self._is_empty(low - 1):
+            low -= 1
+        while high < len(self.lines) and self._is_empty(high + 1):
+            high += 1
+        stmt = self.starts.get(high + 1)
+        if stmt is None or isinstance(stmt, _COMPOUND):
+            # trailing the module, a footer or leading a compound statement.
+            return False
+        prev = self.prev[stmt]
+        if stmt is self.header:
+            raise Ambiguous(f"comment in the header of the module on line {line}")
+        if isinstance(prev, _COMPOUND):
+            indent = _indent(self.lines[stmt.lineno - 1])
+            for other in range(low, high + 1):
+                text = self.lines[other - 1]
+                if text.strip() and _indent(text) != indent:
+                    raise Ambiguous(f"comment on line {line} could be a footer")
+        if not self._is_line_start(stmt):
+            raise Ambiguous(f"comment in a one line block on line {line}")
+        return True
+
+    # Helpers
+
+    def _is_empty(self, line: int) -> bool:
+        """Blank or comment line."""
+        text = self.lines[line - 1].lstrip()
+        return not text or text.startswith("#")
+
+    def _is_marked_comment(self, line: int) -> bool:
+        return line in self.marked and self.lines[line - 1].lstrip().startswith("#")
+
+    def _is_line_start(self, stmt: ast.stmt) -> bool:
+        return not self._text(stmt.lineno, 0, stmt.col_offset).strip()
+
+    def _text(
+        self,
+        lineno: int,
+        col: int,
+        end_col: Optional[int] = None,
+        end_lineno: Optional[int] = None,
+    ) -> str:
+        """Slice the source using the (utf-8 byte) offsets of ast."""
+        end_lineno = end_lineno or lineno
+        lines = [line.encode("utf-8") for line in self.lines[lineno - 1 : end_lineno]]
+        if end_col is not None:
+            lines[-1] = lines[-1][:end_col]
+        lines[0] = lines[0][col:]
+        return b"\n".join(lines).decode("utf-8")
+
+
+def _start(node: Def) -> int:
+    """First line of a definition, including its decorators."""
+    return node.decorator_list[0].lineno if node.decorator_list else node.lineno
+
+
+def _indent(line: str) -> str:
+    return line[: len(line) - len(line.lstrip())]
+
+
+def _is_single_string(text: str) -> bool:
+    """libcst holds a single string literal as a SimpleString."""
+    try:
+        tokens = [
+            tok
+            for tok in tokenize.generate_tokens(io.StringIO(text).readline)
+            if tok.type not in (tokenize.NEWLINE, tokenize.NL, tokenize.ENDMARKER)
+        ]
+    except (tokenize.TokenError, SyntaxError):
+        return False
+    return len(tokens) == 1 and tokens[0].type == tokenize.STRING
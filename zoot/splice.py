@@ -0,0 +1,109 @@
+""" Applies annotations by splicing lines into the source instead of going
+through a libcst transformation of the whole module.
+
+Targets are located with `ast`, the decorators and comments are rendered with
+libcst (they're tiny) and inserted right before the first line of the target,
+which is exactly where DecoAnnotator places them. Output is identical to that of
+DecoAnnotator wherever libcst regenerates the source unchanged (1.0 doesn't for
+some `case` patterns and spacing), source `ast` can't handle is handed over to it.
+"""
+import ast
+from typing import List, Optional, Sequence, Tuple, Type, TypeVar
+
+from zoot.annotate import (
+    ClassDecos,
+    DecoAnnotator,
+    DecoCollector,
+    FuncDecos,
+    NodeMeta,
+    _render,
+)
+from zoot.report import Timer
+from zoot.scan import Ambiguous, _BLOCKS, _COMPOUND, _start, _indent
+
+SA = TypeVar("SA", bound="SpliceAnnotator")
+
+
+class SpliceAnnotator:
+    """Annotates a copied file with the given decorators, see DecoAnnotator."""
+
+    func_decos: FuncDecos
+    cls_decos: ClassDecos
+    # Why DecoAnnotator was used, if it was.
+    fallback: Optional[str]
+
+    def __init__(self, func_decos: FuncDecos, cls_decos: ClassDecos):
+        self.func_decos = func_decos
+        self.cls_decos = cls_decos
+        self.fallback = None
+
+    @classmethod
+    def from_collector(cls: Type[SA], collector: DecoCollector) -> SA:
+        return cls(collector.func_decos, collector.cls_decos)
+
+    def annotate(self, source: str, timer: Optional[Timer] = None) -> str:
+        """Return the source with the annotations applied."""
+        self.fallback = None
+        if not self.func_decos and not self.cls_decos:
+            return source
+        timer = timer or Timer()
+        try:
+            splices = self._splices(source, timer)
+        except Ambiguous as e:
+            self.fallback = str(e)
+            annotate = DecoAnnotator(self.func_decos, self.cls_decos)
+            return annotate.annotate(source, timer)
+        with timer.stage("codegen"):
+            lines = source.split("\n")
+            for line, text in splices:
+                lines[line - 1] = text + lines[line - 1]
+            return "\n".join(lines)
+
+    def _splices(self, source: str, timer: Timer) -> List[Tuple[int, str]]:
+        """Find the (line, text) pairs to insert."""
+        if "\r" in source:
+            raise Ambiguous("source contains carriage returns")
+        with timer.stage("annotate-parse"):
+            try:
+                tree = ast.parse(source)
+            except SyntaxError as e:
+                raise Ambiguous(f"ast can't parse the source: {e}")
+        with timer.stage("annotate-visit"):
+            self._lines = source.split("\n")
+            self._class_name = ""
+            splices: List[Tuple[int, str]] = []
+            self._walk(tree.body, splices)
+        return splices
+
+    def _walk(self, body: Sequence[ast.stmt], splices: List[Tuple[int, str]]) -> None:
+        """Mirror the visit/leave order of DecoAnnotator, the name of the class is
+        only updated when visiting classes with bases.
+        """
+        for stmt in body:
+            if isinstance(stmt, ast.ClassDef):
+                if stmt.bases:
+                    self._class_name = stmt.name
+                self._walk(stmt.body, splices)
+                if self._class_name in self.cls_decos:
+                    meta = self.cls_decos[self._class_name]
+                    splices.append(self._splice(stmt, meta))
+            elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self._walk(stmt.body, splices)
+                key = (self._class_name, stmt.name)
+                if key in self.func_decos:
+                    splices.append(self._splice(stmt, self.func_decos[key]))
+            elif isinstance(stmt, _COMPOUND):
+                for field in _BLOCKS:
+                    for node in getattr(stmt, field, ()):
+                        # except handlers and match cases hold a body.
+                        block = [node] if isinstance(node, ast.stmt) else node.body
+                        self._walk(block, splices)
+
+    def _splice(self, node: ast.stmt, meta: NodeMeta) -> Tuple[int, str]:
+        line = _start(node)  # type: ignore
+        text = self._lines[line - 1]
+        first = node.decorator_list[0] if node.decorator_list else node  # type: ignore
+        prefix = text.encode("utf-8")[: first.col_offset].decode("utf-8")
+        if prefix.strip() != ("@" if first is not node else ""):
+            raise Ambiguous(f"definition on line {line}")
+        return line, _render(meta.decos, meta.leading_comments, _indent(text))
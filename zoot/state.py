@@ -0,0 +1,84 @@
+""" Records the CPython commit every file was last synced from.
+
+The state lives in the RustPython repository, next to the files it describes, so
+an incremental sync only has to look at the files whose blob changed in CPython
+since then. Paths are relative to the `Lib` directory of either repository.
+"""
+import json
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, Set, Union
+
+from zoot.helpers import git_changed_files
+
+STATE_FILE = ".zoot_sync.json"
+# Bump this whenever the format of the state file changes.
+STATE_VERSION = 1
+
+
+class SyncState:
+    """Maps paths under Lib to the CPython commit they were last synced from."""
+
+    path: Path
+    synced: Dict[str, str]
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        self.synced = {}
+
+    @classmethod
+    def load(cls, path: Union[Path, str]) -> "SyncState":
+        """Load the state from the given file, empty if it doesn't exist."""
+        state = cls(path)
+        try:
+            with open(state.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return state
+        if data.get("version") == STATE_VERSION:
+            state.synced = data["synced"]
+        return state
+
+    def save(self) -> None:
+        """Write the state out, sorted so diffs of it stay small."""
+        data = {"version": STATE_VERSION, "synced": self.synced}
+        with open(self.path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    def record(self, name: Union[Path, str], commit: str) -> None:
+        """Record that a file was synced from the given commit."""
+        self.synced[Path(name).as_posix()] = commit
+
+    def changed(
+        self, cpython: Union[Path, str], names: Iterable[str], commit: str
+    ) -> Set[str]:
+        """Of the given names, return those that changed in CPython since they were
+        last synced. Files that were never synced are considered changed, names of
+        directories are changed if any file under them did.
+        """
+        changed: Set[str] = set()
+        # names synced from an older commit, by that commit.
+        by_commit: Dict[str, Set[str]] = {}
+        for name in names:
+            old = self.synced.get(name)
+            if old is None:
+                changed.add(name)
+            elif old != commit:
+                by_commit.setdefault(old, set()).add(name)
+        # files are usually all synced from the same commit, making this a single
+        # diff.
+        for old, olds in by_commit.items():
+            try:
+                diff = git_changed_files(cpython, old, commit, "Lib")
+            except subprocess.CalledProcessError:
+                # commit is gone (e.g. shallow clone), sync them all.
+                changed.update(olds)
+                continue
+            # the files changed and the directories holding them.
+            paths: Set[str] = set()
+            for path in diff:
+                parts = path.split("/")
+                paths.update("/".join(parts[:i]) for i in range(1, len(parts) + 1))
+            changed.update(olds & paths)
+        return changed
@@ -1,7 +1,9 @@
 # Some *very* coarse tests.
+import pickle
+
 import libcst
 
-from zoot.annotate import DecoCollector, DecoAnnotator
+from zoot.annotate import DecoCollector, DecoAnnotator, CompactMeta, compact, expand
 
 # python case, rustpython_case, wanted_result
 func_cases = [
@@ -522,3 +524,30 @@ def test_cases():
             # print(rust_node)
             # yes, libcst allows this to be done easily since source in == source out
             assert wanted_result == node_result.code
+
+
+def test_compact_roundtrip():
+    for cases in (func_cases, cls_cases):
+        for (py_case, rust_case, wanted_result) in cases:
+            c = DecoCollector()
+            _ = libcst.parse_module(rust_case).visit(c)
+            metas = pickle.loads(pickle.dumps(compact(c.func_decos, c.cls_decos)))
+            assert all(isinstance(meta, CompactMeta) for meta in metas)
+            func_decos, cls_decos = expand(metas)
+            assert list(func_decos) == list(c.func_decos)
+            assert list(cls_decos) == list(c.cls_decos)
+            a = DecoAnnotator(func_decos, cls_decos)
+            assert wanted_result == libcst.parse_module(py_case).visit(a).code
+
+
+def test_compact_text():
+    c = DecoCollector()
+    _ = libcst.parse_module(func_cases[3][1]).visit(c)
+    (meta,) = compact(c.func_decos, c.cls_decos)
+    assert meta.target == "Test.test_foo_empty_decos"
+    assert meta.key == ("Test", "test_foo_empty_decos")
+    assert meta.decos == (
+        "\t# TODO: RUSTPYTHON\n\t@unittest.expectedFailure\n",
+        '\t@unittest.skip("TODO: RUSTPYTHON")\n',
+    )
+    assert meta.comments == ()
@@ -0,0 +1,44 @@
+from zoot.__main__ import argparser
+from zoot.asyncdrive import AsyncDriver
+from zoot.drive import Driver
+from zoot.test_drive import cpython, rustpython
+from zoot.test_helpers import _git, _repo
+
+
+def _repos(path):
+    """CPython and RustPython repositories, with a test file without markers and
+    a marked one, both changed in CPython.
+    """
+    repos = [("cpython", "Lib", "3.11"), ("rustpython", "pylib/Lib", "main")]
+    for repo, lib, branch in repos:
+        if repo == "cpython":
+            a, b = cpython + "x = 1\n", cpython + "y = 2\n"
+        else:
+            a, b = cpython, rustpython
+        files = {f"{lib}/test/test_a.py": a, f"{lib}/test/test_b.py": b}
+        _repo(path / repo, files, branch)
+    return [
+        "--cpython", str(path / "cpython"),
+        "--rustpython", str(path / "rustpython"),
+        "--no-cache", "-j", "2", "test_a.py", "test_b.py",
+    ]  # fmt: skip
+
+
+def _history(path):
+    return _git(path, "log", "--format=%s%n%b", "--stat"), _git(path, "status", "-s")
+
+
+def test_same_history(tmp_path):
+    histories = []
+    for driver in (Driver, AsyncDriver):
+        path = tmp_path / driver.__name__
+        driver(argparser.parse_args(_repos(path))).run()
+        histories.append(_history(path / "rustpython"))
+    assert histories[0] == histories[1]
+    log, status = histories[0]
+    assert "Update test_b.py from CPython 3.11." in log
+    # annotations and the sync state are left staged.
+    assert status.splitlines() == [
+        "A  pylib/Lib/.zoot_sync.json",
+        "M  pylib/Lib/test/test_b.py",
+    ]
@@ -0,0 +1,75 @@
+import io
+import os
+from contextlib import redirect_stderr
+
+from zoot.cache import AnnotationCache, Entry, blob_sha
+from zoot.drive import collect_annotations
+
+source = """
+class Test(base_class):
+
+    # TODO: RUSTPYTHON
+    @unittest.expectedFailure
+    def test_foo(self):
+        pass
+"""
+stray = """
+class C(T):
+    def f(self):
+        # TODO: RUSTPYTHON
+        hack()
+"""
+
+
+def test_blob_sha():
+    # same as `git hash-object` on a file with contents 'zoot\n'
+    assert blob_sha("zoot\n") == "345f0b9430e2c5e898194fd3a77130d359f63e9d"
+
+
+def test_hit(tmp_path):
+    cache = AnnotationCache(tmp_path, 1024 * 1024)
+    assert cache.get("test", source) is None
+    collected = collect_annotations("test", source, cache)
+    entry = cache.get("test", source)
+    assert entry is not None
+    assert [meta.target for meta in entry.metas] == ["Test.test_foo"]
+    # a hit gives back the same annotations without parsing.
+    cached = collect_annotations("test", source, cache)
+    assert cached.info() == collected.info()
+    assert cached.func_decos[("Test", "test_foo")].decos[0].deep_equals(
+        collected.func_decos[("Test", "test_foo")].decos[0]
+    )
+
+
+def test_warnings_name_their_file(tmp_path):
+    cache = AnnotationCache(tmp_path, 1024 * 1024)
+    for name in ("test_a", "test_b", "test_b"):
+        with redirect_stderr(io.StringIO()) as err:
+            collected = collect_annotations(name, stray, cache)
+        # the same content, under another name, isn't a hit.
+        assert collected.warnings == [err.getvalue().strip()]
+        assert f"'{name}'" in collected.warnings[0]
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = AnnotationCache(tmp_path, 1024 * 1024)
+    cache.put("test", source, Entry([], []))
+    cache.entry_path("test", source).write_bytes(b"not a pickle")
+    assert cache.get("test", source) is None
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = AnnotationCache(tmp_path, 1024 * 1024)
+    sources = [f"# {i}\n" for i in range(4)]
+    for i, src in enumerate(sources):
+        cache.put("test", src, Entry([], ["x" * 1024]))
+        os.utime(cache.entry_path("test", src), (i, i))
+    # touch the oldest, it shouldn't be evicted.
+    assert cache.get("test", sources[0]) is not None
+    size = cache.entry_path("test", sources[0]).stat()
+    cache.max_size = 2 * size.st_size
+    assert cache.evict() == 2
+    assert cache.get("test", sources[0]) is not None
+    assert cache.get("test", sources[1]) is None
+    assert cache.get("test", sources[2]) is None
+    assert cache.get("test", sources[3]) is not None
@@ -125,4 +125,28 @@ def test_func_comments():
         with redirect_stderr(s):
             _ = node.visit(c)
         assert s.getvalue().strip() == expected
-        
\ No newline at end of file
+        
+
+def test_pruned_traversal():
+    # pruning applies when visiting a module, results should match the full traversal.
+    for stmt, expected in comment_cases:
+        node = libcst.parse_module(stmt)
+        c = DecoCollector("test", prune=True)
+        s = StringIO()
+        with redirect_stderr(s):
+            _ = node.visit(c)
+        assert s.getvalue().strip() == expected
+    for (index, (case, _)) in enumerate(cases):
+        func = f"""def func_{index}(): pass"""
+        class_ = _wrap_in_class(
+            case.format(obj=func), f"cls_{index}", bases="some_base"
+        )
+        module = libcst.parse_module(
+            "if True:\n    try:\n        pass\n    finally:\n"
+            + "".join(f"        {line}\n" for line in class_.splitlines())
+        )
+        full, pruned = DecoCollector(), DecoCollector(prune=True)
+        _ = module.visit(full)
+        _ = module.visit(pruned)
+        assert list(full.func_decos) == list(pruned.func_decos)
+        assert list(full.cls_decos) == list(pruned.cls_decos)
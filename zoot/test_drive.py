@@ -0,0 +1,221 @@
+import argparse
+import pickle
+import subprocess
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+from zoot import drive
+from zoot.__main__ import argparser
+from zoot.drive import MEMORY_FACTOR, Driver, Row, Source, bounded_map, sync_row
+from zoot.test_helpers import _git, _repo
+
+cpython = """
+class Test(base_class):
+
+    def test_foo(self):
+        pass
+"""
+
+rustpython = """
+class Test(base_class):
+
+    @unittest.skip("TODO: RUSTPYTHON")
+    def test_foo(self):
+        pass
+"""
+
+
+def test_sync_row():
+    synced = sync_row(Row("test_foo.py", cpython, rustpython, None))
+    assert synced.code == rustpython
+
+
+def test_sync_row_fast_path():
+    # no markers, nothing is parsed and the file should be copied as is.
+    synced = sync_row(Row("test_foo.py", "class (:", cpython, None))
+    assert synced.code is None
+
+
+class _Pool:
+    """Runs submitted calls right away, counting them."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_bounded_map():
+    rows = [Row(f"test_{i}.py", "#" * n, "", None) for i, n in enumerate([3, 1, 1, 5])]
+    pool, in_flight = _Pool(), []
+    results = bounded_map(pool, 3 * MEMORY_FACTOR, lambda row: row.filename, rows)
+    for i, name in enumerate(results):
+        in_flight.append(pool.submitted - i)
+        assert name == rows[i].filename
+    # the two small files fit together, the large one goes alone.
+    assert in_flight == [1, 2, 1, 1]
+
+
+def test_source(tmp_path):
+    test = _repo(tmp_path)
+    (test / "test_a.py").write_bytes(b"a = 2\r\n")
+    source = Source("Lib/test/test_a.py", 6, "HEAD", str(tmp_path))
+    assert pickle.loads(pickle.dumps(source)) == source
+    assert source.read() == "a = 1\n"
+    # universal newlines, like reading the work tree.
+    assert drive._source(test / "test_a.py").read() == "a = 2\n"
+    assert Row("test_a.py", source, "a", None).size == 7
+    drive._close_git_objects()
+
+
+def _testlib(tmp_path, **kwargs):
+    """A TestLib over empty, non git, CPython and RustPython trees."""
+    for lib in ("cpython/Lib/test", "rustpython/pylib/Lib/test"):
+        (tmp_path / lib).mkdir(parents=True, exist_ok=True)
+    args = dict(
+        cpython=tmp_path / "cpython",
+        rustpython=tmp_path / "rustpython",
+        filenames=[],
+        copy_libs=True,
+        ref=None,
+        all=False,
+        lib_map=None,
+    )
+    args.update(kwargs)
+    # not imported by name, pytest would try to collect it.
+    return drive.TestLib(argparse.Namespace(**args))
+
+
+def test_discover(tmp_path):
+    testlib = _testlib(tmp_path)
+    for name, size in [("test_a.py", 1), ("test_b.py", 3), ("test_c.py", 2)]:
+        (testlib.cpython_testlib / name).write_text("#" * size)
+        (testlib.rustpython_testlib / name).write_text("")
+    (testlib.cpython_testlib / "test_new.py").write_text("")
+    (testlib.rustpython_testlib / "test_gone.py").write_text("")
+    (testlib.rustpython_testlib / "helper.py").write_text("")
+
+    testlib = _testlib(tmp_path, all=True)
+    assert testlib.filenames == ["test_b.py", "test_c.py", "test_a.py"]
+    assert testlib.only_cpython == ["test_new.py"]
+    assert testlib.only_rustpython == ["test_gone.py"]
+
+
+def test_package_rows(tmp_path):
+    testlib = _testlib(tmp_path)
+    for lib in (testlib.cpython_testlib, testlib.rustpython_testlib):
+        (lib / "test_pkg" / "data").mkdir(parents=True)
+        (lib / "test_pkg" / "__init__.py").write_text("")
+    (testlib.cpython_testlib / "test_pkg" / "test_a.py").write_text(cpython)
+    (testlib.cpython_testlib / "test_pkg" / "data" / "x.bin").write_bytes(b"\xff")
+    (testlib.rustpython_testlib / "test_pkg" / "test_a.py").write_text(rustpython)
+
+    testlib = _testlib(tmp_path, filenames=["test_pkg"])
+    assert testlib.filenames == ["test_pkg"]
+    rows = list(testlib)
+    assert [row.filename for row in rows] == [
+        "test_pkg/__init__.py",
+        "test_pkg/data/x.bin",
+        "test_pkg/test_a.py",
+    ]
+    assert all(row.package == "test_pkg" for row in rows)
+    # data files aren't read, they are copied as is.
+    assert sync_row(rows[1]).code is None
+    assert sync_row(rows[2]).code == rustpython
+    assert _testlib(tmp_path, all=True).filenames == ["test_pkg"]
+
+
+def test_copy_lib(tmp_path):
+    testlib = _testlib(tmp_path)
+    (testlib.cpython_lib / "pkg" / "sub").mkdir(parents=True)
+    (testlib.cpython_lib / "pkg" / "__init__.py").write_bytes(b"\xff\r\n")
+    (testlib.cpython_lib / "pkg" / "sub" / "mod.py").write_text("x = 1\n")
+    (testlib.cpython_lib / "mod.py").write_text("y = 1\n")
+    testlib = _testlib(tmp_path)
+    assert testlib.find_library("test_pkg") == "pkg"
+    assert testlib.find_library("test_mod.py") == "mod.py"
+    assert testlib.find_library("test_missing.py") is None
+
+    assert testlib.copy_lib("pkg") == (2, 0, 0)
+    assert (testlib.rustpython_lib / "pkg" / "__init__.py").read_bytes() == b"\xff\r\n"
+    (testlib.cpython_lib / "pkg" / "sub" / "mod.py").write_text("x = 2\n")
+    # only the changed file is copied again.
+    assert testlib.copy_lib("pkg") == (1, 1, 0)
+    assert (testlib.rustpython_lib / "pkg" / "sub" / "mod.py").read_text() == "x = 2\n"
+    assert testlib.copy_lib("mod.py") == (1, 0, 0)
+    assert testlib.copy_lib("mod.py") == (0, 1, 0)
+
+
+@pytest.mark.parametrize("ref", [False, True])
+def test_copy_lib_removals(tmp_path, ref):
+    testlib = _testlib(tmp_path)
+    (testlib.cpython_lib / "pkg").mkdir()
+    (testlib.cpython_lib / "pkg" / "__init__.py").write_text("")
+    for name in ("__init__.py", "old.py", "sub/old.py", "__pycache__/x.pyc"):
+        (testlib.rustpython_lib / "pkg" / name).parent.mkdir(exist_ok=True)
+        (testlib.rustpython_lib / "pkg" / name).write_text("")
+    if ref:
+        repo = tmp_path / "cpython"
+        _repo(repo, files={})
+        testlib = _testlib(tmp_path, ref=_git(repo, "rev-parse", "HEAD"))
+    # modules gone from CPython are removed, along with the directories emptied.
+    assert testlib.copy_lib("pkg") == (0, 1, 2)
+    assert not (testlib.rustpython_lib / "pkg" / "old.py").exists()
+    assert not (testlib.rustpython_lib / "pkg" / "sub").exists()
+    assert (testlib.rustpython_lib / "pkg" / "__pycache__" / "x.pyc").exists()
+    testlib.close()
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_package_removals(tmp_path, batch):
+    names = {
+        "cpython": ["__init__.py", "test_a.py"],
+        "rustpython": ["__init__.py", "test_a.py", "test_old.py", "data/old.txt"],
+    }
+    repos = [("cpython", "Lib", "3.11"), ("rustpython", "pylib/Lib", "main")]
+    for repo, lib, branch in repos:
+        files = {f"{lib}/test/test_pkg/{name}": cpython for name in names[repo]}
+        _repo(tmp_path / repo, files, branch)
+    args = [
+        "--cpython", str(tmp_path / "cpython"),
+        "--rustpython", str(tmp_path / "rustpython"),
+        "--no-cache", "test_pkg", *(["--batch-commits"] if batch else []),
+    ]  # fmt: skip
+    Driver(argparser.parse_args(args)).run()
+
+    rustpython = tmp_path / "rustpython"
+    # the files gone from CPython are removed, in the update of the package.
+    assert _git(rustpython, "log", "-1", "--format=%s") == (
+        "Update test_pkg from CPython 3.11."
+    )
+    assert _git(rustpython, "show", "--name-status", "--format=", "HEAD") == (
+        "D\tpylib/Lib/test/test_pkg/data/old.txt\n"
+        "D\tpylib/Lib/test/test_pkg/test_old.py"
+    )
+    package = rustpython / "pylib" / "Lib" / "test" / "test_pkg"
+    assert sorted(p.name for p in package.iterdir()) == ["__init__.py", "test_a.py"]
+
+
+def test_skip_unchanged_writes(tmp_path):
+    testlib = _testlib(tmp_path)
+    (testlib.cpython_testlib / "test_foo.py").write_text(cpython)
+    assert testlib.write_to_rustpython("test_foo.py", rustpython)
+    assert not testlib.write_to_rustpython("test_foo.py", rustpython)
+    assert testlib.is_current("test_foo.py", rustpython)
+    assert not testlib.is_current("test_foo.py", cpython)
+    assert testlib.copy_to_rustpython("test_foo.py")
+    assert not testlib.copy_to_rustpython("test_foo.py")
+    assert testlib.is_current("test_foo.py", cpython)
+
+
+def test_startup_imports():
+    # libcst is only needed once a file is parsed, not to handle the arguments.
+    code = "import sys, zoot.__main__, zoot.drive; print('libcst' in sys.modules)"
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert out.strip() == "False"
@@ -0,0 +1,118 @@
+import json
+import sys
+import time
+
+from zoot.__main__ import argparser
+from zoot.drive import Driver
+from zoot.execute import parse_verbose, run_modules
+from zoot.test_asyncdrive import _repos
+
+output = """\
+test_doc (test.test_mod.A.test_doc)
+A docstring. ... ok
+test_fail (test.test_mod.A.test_fail) ... FAIL
+test_print (test.test_mod.A.test_print) ... noise
+more noiseok
+test_skip (test.test_mod.A.test_skip) ... skipped 'TODO: RUSTPYTHON'
+test_sub (test.test_mod.A.test_sub) ...
+  test_sub (test.test_mod.A.test_sub) (i=1) ... FAIL
+test_xfail (test.test_mod.A.test_xfail) ... expected failure
+test_xpass (test.test_mod.A) ... unexpected success
+setUpClass (test.test_mod.C) ... ERROR
+test_hang (test.test_mod.D.test_hang) ...
+
+======================================================================
+FAIL: test_fail (test.test_mod.A.test_fail)
+test_after (test.test_mod.A.test_after) ... ok
+"""
+
+
+def test_parse_verbose():
+    assert parse_verbose(output, "test.test_mod", "timeout") == {
+        "A.test_doc": "pass",
+        "A.test_fail": "fail",
+        "A.test_print": "pass",
+        "A.test_skip": "skip",
+        "A.test_sub": "fail",
+        "A.test_xfail": "xfail",
+        "A.test_xpass": "xpass",
+        "C.setUpClass": "error",
+        "D.test_hang": "timeout",
+    }
+
+
+tests = """\
+import time
+import unittest
+
+class Test(unittest.TestCase):
+    def test_ok(self):
+        pass
+
+    @unittest.expectedFailure
+    def test_fixed(self):
+        pass
+
+    def test_sleep(self):
+        time.sleep({sleep})
+"""
+
+
+def test_run_modules(tmp_path):
+    (tmp_path / "test").mkdir()
+    (tmp_path / "test" / "__init__.py").write_text("")
+    (tmp_path / "test" / "test_a.py").write_text(tests.format(sleep=0))
+    (tmp_path / "test" / "test_b.py").write_text(tests.format(sleep=30))
+    units = ["test_a.py", "test_b.py"]
+    a, b = run_modules(sys.executable, tmp_path, units, jobs=2, timeout=2)
+    assert a.unit == "test_a.py" and a.returncode == 1 and not a.crashed
+    assert a.tests == {
+        "Test.test_fixed": "xpass",
+        "Test.test_ok": "pass",
+        "Test.test_sleep": "pass",
+    }
+    assert a.failing() == [("Test.test_fixed", "xpass")]
+    # killed while sleeping, the tests that finished are kept.
+    assert b.timed_out and b.tests["Test.test_sleep"] == "timeout"
+    assert b.tests["Test.test_ok"] == "pass"
+
+
+spawns = """\
+import subprocess
+import sys
+import time
+import unittest
+
+child = "import time; time.sleep(3); open('alive', 'w')"
+
+class Test(unittest.TestCase):
+    def test_spawn(self):
+        # shares the output of the interpreter, holding it open.
+        subprocess.Popen([sys.executable, "-c", child])
+        time.sleep(60)
+"""
+
+
+def test_run_modules_spawning(tmp_path):
+    (tmp_path / "test").mkdir()
+    (tmp_path / "test" / "__init__.py").write_text("")
+    (tmp_path / "test" / "test_c.py").write_text(spawns)
+    (c,) = run_modules(sys.executable, tmp_path, ["test_c.py"], timeout=2)
+    assert c.timed_out and c.tests == {"Test.test_spawn": "timeout"}
+    assert c.duration < 30
+    # the child is killed too, rather than left running.
+    time.sleep(3)
+    assert not (tmp_path / "alive").exists()
+
+
+def test_execute(tmp_path):
+    args = _repos(tmp_path)
+    results = tmp_path / "results.json"
+    args += ["--execute", "--interpreter", sys.executable, "--results", str(results)]
+    Driver(argparser.parse_args(args)).run()
+    with open(results) as f:
+        data = json.load(f)
+    # both are changed in CPython, neither imports, base_class is undefined.
+    assert list(data) == ["test_a.py", "test_b.py"]
+    assert data["test_b.py"]["returncode"] == 1
+    assert "error" in data["test_b.py"]["tests"].values()
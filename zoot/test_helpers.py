@@ -0,0 +1,187 @@
+import asyncio
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from zoot.helpers import Git, GitBatch, GitObjects, git_resolve
+
+
+def _git(path, *args):
+    return subprocess.check_output(["git", *args], cwd=path).decode("utf-8").strip()
+
+
+def _repo(path, files=None, branch="main"):
+    """A repository with files, their contents keyed by path, committed along with
+    anything already in it. By default a single test file, in Lib/test.
+    """
+    if files is None:
+        files = {"Lib/test/test_a.py": "a = 1\n"}
+    path.mkdir(parents=True, exist_ok=True)
+    _git(path, "init", "-q", "-b", branch)
+    _git(path, "config", "user.name", "zoot")
+    _git(path, "config", "user.email", "zoot@example.com")
+    for name, content in files.items():
+        (path / name).parent.mkdir(parents=True, exist_ok=True)
+        (path / name).write_text(content)
+    _git(path, "add", "-A")
+    _git(path, "commit", "-q", "-m", "init")
+    return path / "Lib" / "test"
+
+
+def test_objects(tmp_path):
+    test = _repo(tmp_path)
+    _git(tmp_path, "tag", "v1")
+    (test / "test_a.py").write_text("a = 2\n")
+    objects = GitObjects(tmp_path)
+    # read from the ref, not the work tree.
+    assert objects.get("v1:Lib/test/test_a.py") == ("blob", b"a = 1\n")
+    assert objects.get("v1:Lib/test")[0] == "tree"
+    assert objects.get("v1:Lib/test/test_b.py") is None
+    assert objects.get("v1:Lib/test/test_a.py") == ("blob", b"a = 1\n")
+    objects.close()
+    assert git_resolve(tmp_path, "v1") == _git(tmp_path, "rev-parse", "HEAD")
+    assert git_resolve(tmp_path, "v2") is None
+
+
+def test_batch_commits(tmp_path):
+    test = _repo(tmp_path)
+    script = test / "test_script.py"
+    script.write_text("b = 1\n")
+    script.chmod(0o755)
+    _git(tmp_path, "add", "--chmod=+x", "Lib/test/test_script.py")
+    _git(tmp_path, "commit", "-q", "-m", "Add test_script.py")
+
+    batch = GitBatch(test)
+    # same as HEAD, no commit is made.
+    batch.add("test_a.py")
+    batch.commit("Nothing")
+    (test / "test_a.py").write_text("a = 2\n")
+    batch.add("test_a.py")
+    batch.commit("Update test_a.py")
+    # unchanged since the last commit, no commit is made.
+    batch.add("test_a.py")
+    batch.commit("Nothing")
+    (test / "test_a.py").write_text("a = 3\n")
+    batch.add("test_a.py")
+    script.write_text("b = 2\n")
+    batch.add("test_script.py")
+    batch.commit("Mark failing tests in test_a.py")
+    # nothing is written until the batch is closed.
+    assert _git(tmp_path, "log", "-1", "--format=%s") == "Add test_script.py"
+    batch.close()
+
+    assert batch.commits == 2
+    log = _git(tmp_path, "log", "--format=%s").splitlines()
+    assert log[:2] == ["Mark failing tests in test_a.py", "Update test_a.py"]
+    assert _git(tmp_path, "show", "HEAD~:Lib/test/test_a.py") == "a = 2"
+    assert _git(tmp_path, "show", "HEAD:Lib/test/test_a.py") == "a = 3"
+    # executable files stay so, as they would with git add.
+    script_entry = _git(tmp_path, "ls-tree", "HEAD", "Lib/test/test_script.py")
+    assert script_entry.startswith("100755 ")
+    # index and working tree match the new HEAD.
+    assert _git(tmp_path, "status", "--porcelain") == ""
+
+
+def test_batch_removals(tmp_path):
+    test = _repo(tmp_path)
+    batch = GitBatch(test)
+    (test / "test_a.py").unlink()
+    # never committed, nothing to remove.
+    batch.add("test_b.py")
+    batch.add("test_a.py")
+    batch.commit("Remove test_a.py")
+    batch.close()
+
+    assert _git(tmp_path, "log", "--format=%s").splitlines()[0] == "Remove test_a.py"
+    assert _git(tmp_path, "ls-files") == ""
+    assert _git(tmp_path, "status", "--porcelain") == ""
+
+
+def test_concurrent_queries(tmp_path):
+    _repo(tmp_path)
+    git, cwd = Git(tmp_path), os.getcwd()
+    head = _git(tmp_path, "rev-parse", "HEAD")
+    objects = GitObjects(tmp_path)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        heads = list(pool.map(lambda _: git.query("rev-parse", "HEAD"), range(16)))
+        rev = "HEAD:Lib/test/test_a.py"
+        blobs = list(pool.map(lambda _: objects.get(rev), range(16)))
+    objects.close()
+    assert heads == [head] * 16
+    assert blobs == [("blob", b"a = 1\n")] * 16
+
+    async def queries():
+        return await asyncio.gather(
+            *(git.aquery("rev-parse", "HEAD") for _ in range(8)),
+            git.awrite("tag", "v1"),
+        )
+
+    assert asyncio.run(queries()) == [head] * 8 + [""]
+    assert git.query("rev-parse", "v1") == head
+    with pytest.raises(subprocess.CalledProcessError):
+        asyncio.run(git.aquery("rev-parse", "--verify", "--quiet", "nope"))
+    # the working directory of the process is never changed.
+    assert os.getcwd() == cwd
+
+
+def _hold(git):
+    """Hold a transaction in a thread, until the returned event is set."""
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with git.transaction():
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    return thread, release
+
+
+def test_transaction(tmp_path):
+    _repo(tmp_path)
+    git = Git(tmp_path)
+    thread, release = _hold(git)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        tagged = pool.submit(git.write, "tag", "v1")
+        # waits for the transaction to end.
+        assert not tagged.done() and _git(tmp_path, "tag") == ""
+        release.set()
+        tagged.result(timeout=10)
+    thread.join()
+    assert _git(tmp_path, "tag") == "v1"
+
+
+def test_cancelled_awrite(tmp_path):
+    _repo(tmp_path)
+    git = Git(tmp_path)
+
+    async def cancel():
+        release = asyncio.Event()
+
+        async def hold():
+            async with git.atransaction():
+                # writes of the task holding it don't wait.
+                await git.awrite("tag", "v0")
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.1)
+        task = asyncio.ensure_future(git.awrite("tag", "v1"))
+        await asyncio.sleep(0.1)
+        # waits for the transaction to end.
+        assert not task.done() and _git(tmp_path, "tag") == "v0"
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+        await holder
+        # the lock was released, writes don't deadlock.
+        await asyncio.wait_for(git.awrite("tag", "v2"), 10)
+
+    asyncio.run(cancel())
+    assert _git(tmp_path, "tag").splitlines() == ["v0", "v2"]
@@ -0,0 +1,46 @@
+from zoot.libindex import LibIndex
+
+paths = [
+    "os.py",
+    "json/__init__.py",
+    "json/decoder.py",
+    "http/__init__.py",
+    "http/cookies.py",
+    "http/cookiejar.py",
+    "xml/etree/ElementTree.py",
+    "urllib/request.py",
+    "test/test_os.py",
+    "json/__pycache__/decoder.cpython-311.pyc",
+]
+
+
+def test_resolve():
+    index = LibIndex(paths)
+    assert index.resolve("test_os.py") == "os.py"
+    assert index.resolve("test_os") == "os.py"
+    assert index.resolve("test_json") == "json"
+    assert index.resolve("test_http_cookies.py") == "http/cookies.py"
+    assert index.resolve("test_http_cookiejar.py") == "http/cookiejar.py"
+    assert index.resolve("test_xml_etree.py") == "xml/etree"
+    assert index.resolve("test_missing.py") is None
+    assert index.resolve("os.py") is None
+    # the tests themselves aren't indexed.
+    assert "test" not in index
+    assert "json/__pycache__" not in index
+
+
+def test_mapping():
+    index = LibIndex(paths, {"test_urllib2": "urllib/request.py", "test_os": None})
+    assert index.resolve("test_urllib2.py") == "urllib/request.py"
+    assert index.resolve("test_os.py") is None
+    # mapped libraries must exist.
+    index.mapping["test_gone"] = "gone.py"
+    assert index.resolve("test_gone.py") is None
+
+
+def test_from_dir(tmp_path):
+    for path in paths:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("")
+    index = LibIndex.from_dir(tmp_path, {})
+    assert index.files == LibIndex(paths).files
@@ -0,0 +1,76 @@
+import json
+import sys
+import tracemalloc
+
+import pytest
+
+from zoot.drive import Row, sync_row
+from zoot.report import Report, Timer
+from zoot.test_drive import cpython, rustpython
+
+
+def test_timer():
+    timer = Timer()
+    with timer.stage("a"):
+        pass
+    with timer.stage("a"):
+        pass
+    timer.merge({"a": 1.0, "b": 2.0})
+    assert set(timer.stages) == {"a", "b"}
+    assert 1.0 <= timer.stages["a"] < 2.0
+    assert timer.total == timer.stages["a"] + 2.0
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="needs tracemalloc.reset_peak")
+def test_timer_memory():
+    tracing = tracemalloc.is_tracing()
+    timer = Timer(trace=True)
+    try:
+        with timer.stage("alloc"):
+            held = bytearray(1024 * 1024)
+            bytearray(4 * 1024 * 1024)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    peak, retained = timer.memory["alloc"]
+    assert peak >= 5 * 1024 * 1024
+    assert 1024 * 1024 <= retained < 2 * 1024 * 1024
+    del held
+
+
+def test_sync_row_stages():
+    stages = {"read", "collect-parse", "collect-visit", "annotate-parse"}
+    for collector, annotator in [("libcst", "libcst"), ("scan", "splice")]:
+        row = Row("test_foo.py", cpython, rustpython, None)
+        synced = sync_row(row, collector=collector, annotator=annotator)
+        assert stages | {"annotate-visit", "codegen"} == set(synced.stages)
+        assert synced.decos == (1, 0)
+    synced = sync_row(Row("test_foo.py", cpython, cpython, None))
+    assert list(synced.stages) == ["read"] and synced.decos == (0, 0)
+
+
+def test_report(tmp_path):
+    report = Report()
+    for name, seconds in [("test_a.py", 1.0), ("test_b.py", 3.0)]:
+        file = report.file(name)
+        file.add("read", seconds)
+        file.add("write", 1.0)
+        file.bytes, file.func_decos = 10, 2
+    report.run.add("git-checkout", 0.5)
+    report.save(tmp_path / "report.json")
+
+    with open(tmp_path / "report.json") as f:
+        data = json.load(f)
+    assert data["files"]["test_b.py"]["total"] == 4.0
+    agg = data["aggregate"]
+    assert agg["files"] == 2 and agg["bytes"] == 20 and agg["function_decorators"] == 4
+    assert agg["stages"]["read"] == {
+        "total": 4.0,
+        "files": 2,
+        "max": 3.0,
+        "max_file": "test_b.py",
+        "mean": 2.0,
+    }
+    assert agg["run"] == {"git-checkout": 0.5}
+    assert [s["file"] for s in agg["slowest"]] == ["test_b.py", "test_a.py"]
+    assert report.summary()[0].startswith("read")
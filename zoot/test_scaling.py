@@ -0,0 +1,99 @@
+# Scaling tests, time taken should grow linearly with the size of the input and
+# with the number of annotations. Catches quadratic behavior in the visitors.
+# They take minutes, set ZOOT_SCALING to run them.
+import io
+import math
+import os
+from contextlib import redirect_stderr
+
+import pytest
+
+from benchmarks.corpus import Config, generate
+from zoot.annotate import DecoAnnotator, DecoCollector
+from zoot.report import Timer
+from zoot.scan import ScanCollector
+from zoot.splice import SpliceAnnotator
+
+SCALING = os.environ.get("ZOOT_SCALING")
+FACTORS = [1, 2, 4, 8]
+# Quadratic growth has an exponent of 2, leave room for noise and the mildly
+# superlinear parse of libcst.
+MAX_EXPONENT = 1.5
+REPEAT = 5
+# Seconds, what's left after subtracting the baseline is never below this.
+FLOOR = 1e-4
+
+
+def _collect(collector, module, timer):
+    with redirect_stderr(io.StringIO()):
+        collector.collect(module.rustpython, timer)
+
+
+def _annotate(annotator, module):
+    collect = DecoCollector(prune=True)
+    _collect(collect, module, Timer())
+    annotate = annotator.from_collector(collect)
+    return lambda timer: annotate.annotate(module.cpython, timer)
+
+
+stages = {
+    "collect-libcst": lambda m: lambda t: _collect(DecoCollector(prune=True), m, t),
+    "collect-scan": lambda m: lambda t: _collect(ScanCollector(), m, t),
+    "annotate-libcst": lambda m: _annotate(DecoAnnotator, m),
+    "annotate-splice": lambda m: _annotate(SpliceAnnotator, m),
+}
+# Bigger files, with the same share of annotations, measured against a file with
+# a single class. And files of the same size with more annotations, leaving out
+# parsing, the same for all of them and much slower than handling the markers.
+inputs = {
+    "size": [Config(classes=8 * f, methods=10, density=0.1, body=3) for f in FACTORS],
+    "annotations": [
+        Config(classes=20, methods=40, density=0.1 * f, body=1) for f in FACTORS
+    ],
+}
+baselines = {"size": Config(classes=1, methods=10, density=0.1, body=3)}
+
+
+def _best(fn, parse=True):
+    """Least time over REPEAT runs, summing the stages fn records."""
+    timings = []
+    for _ in range(REPEAT):
+        timer = Timer()
+        fn(timer)
+        timings.append(
+            sum(
+                seconds
+                for name, seconds in timer.stages.items()
+                if parse or not name.endswith("-parse")
+            )
+        )
+    return min(timings)
+
+
+def _exponent(xs, ys):
+    """Slope of the least squares fit of log(y) against log(x)."""
+    lx, ly = [math.log(x) for x in xs], [math.log(y) for y in ys]
+    mx, my = sum(lx) / len(lx), sum(ly) / len(ly)
+    num = sum((x - mx) * (y - my) for x, y in zip(lx, ly))
+    return num / sum((x - mx) ** 2 for x in lx)
+
+
+def test_exponent():
+    assert _exponent([1, 2, 4], [3, 6, 12]) == pytest.approx(1)
+    assert _exponent([1, 2, 4], [1, 4, 16]) == pytest.approx(2)
+
+
+@pytest.mark.skipif(not SCALING, reason="set ZOOT_SCALING to run")
+@pytest.mark.parametrize("input", inputs)
+@pytest.mark.parametrize("stage", stages)
+def test_linear(stage, input):
+    modules = [generate(config) for config in inputs[input]]
+    # what grows, lines or annotations.
+    sizes = [m.lines if input == "size" else m.marked for m in modules]
+    parse = input == "size"
+    timings = [_best(stages[stage](module), parse) for module in modules]
+    if input in baselines:
+        base = _best(stages[stage](generate(baselines[input])))
+        timings = [max(t - base, FLOOR) for t in timings]
+    exponent = _exponent(sizes, timings)
+    assert exponent < MAX_EXPONENT, list(zip(sizes, timings))
@@ -0,0 +1,244 @@
+# Differential tests, the scan backend should agree with DecoCollector.
+import os
+import random
+import sysconfig
+import tokenize
+from contextlib import redirect_stderr, suppress
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from libcst import ParserSyntaxError
+
+from zoot.annotate import DecoCollector, compact
+from zoot.scan import ScanCollector
+from zoot.test_annotate import func_cases, cls_cases
+
+# Set to a directory of test files (e.g. Lib/test of CPython) to check all of them.
+CORPUS = os.environ.get("ZOOT_CORPUS")
+STDLIB_TEST = Path(sysconfig.get_paths()["stdlib"]) / "test"
+SAMPLE = ["test_bool.py", "test_list.py", "test_userdict.py", "test_with.py"]
+
+# [source, falls back to libcst]
+cases = [
+    # same indentation as the function, after a compound statement.
+    [
+        """
+class A(B):
+    def f(self):
+        pass
+    # TODO: RUSTPYTHON
+    @unittest.expectedFailure
+    def g(self):
+        pass
+""",
+        False,
+    ],
+    # indented further, this is the footer of f.
+    [
+        """
+class A(B):
+    def f(self):
+        pass
+        # TODO: RUSTPYTHON
+    @unittest.expectedFailure
+    def g(self):
+        pass
+""",
+        True,
+    ],
+    # after a simple statement, the comment belongs to g regardless.
+    [
+        """
+class A(B):
+    x = 1
+  # TODO: RUSTPYTHON
+    @unittest.expectedFailure
+    def g(self):
+        pass
+""",
+        False,
+    ],
+    [
+        """
+class A(B):
+    x = 1
+
+    # TODO: RUSTPYTHON
+
+    @unittest.expectedFailure
+
+    # sandwiched rustpython
+
+    @unittest.expectedFailure
+    @unittest.skip(
+        "TODO: RUSTPYTHON", # a comment
+    )  # trailing
+    def g(self):
+        pass
+""",
+        False,
+    ],
+    # comments in the module header.
+    [
+        """
+# TODO: RUSTPYTHON
+@unittest.skip("rustpython")
+class A(B):
+    pass
+""",
+        True,
+    ],
+    # stray comments.
+    [
+        """
+import x
+x = 1  # rustpython
+# rustpython
+y = 2
+class A(B):
+    def f(self):
+        if x:
+            pass
+        # TODO: RUSTPYTHON
+        else:
+            y = (1,
+                 # rustpython inside
+                 2)
+        s = '''
+        # rustpython in a string
+        '''
+        # rustpython end of block
+    def g(self):  # rustpython on the header
+        pass
+# rustpython at the end
+""",
+        False,
+    ],
+    [
+        """
+import x
+class A(B):
+    def f(self):
+        if x: y = 1  # rustpython
+""",
+        True,
+    ],
+    # unsupported arguments and nesting.
+    [
+        """
+import x
+class C:
+    @unittest.skip("rustpython")
+    def f(self): pass
+class D(C):
+    class E:
+        @unittest.skip("rustpython ü")  # ünïcode
+        def f(self): pass
+    async def g(self):
+        # TODO: RUSTPYTHON
+        @unittest.expectedFailure
+        def inner(): pass
+    @unittest.skip(reason="rustpython")
+    def h(self): pass
+    @a.unittest.skip("rustpython")
+    def i(self): pass
+""",
+        False,
+    ],
+    [
+        """
+import x
+class A(B):
+    @unittest.skip('a' 'rustpython')
+    def f(self): pass
+""",
+        True,
+    ],
+    [
+        """
+import x
+class A(B):
+    @unittest.skip('''TODO: RUSTPYTHON
+    multi line''')
+    def f(self): pass
+""",
+        True,
+    ],
+]
+
+# forms used when sprinkling markers over real test files.
+_forms = [
+    "{i}# TODO: RUSTPYTHON\n{i}@unittest.expectedFailure\n",
+    "{i}@unittest.skip('TODO: RUSTPYTHON')\n",
+    '{i}@unittest.skip(\n{i}    "TODO: RUSTPYTHON"\n{i})\n',
+    "{i}# TODO: RUSTPYTHON\n{i}@unittest.expectedFailure  # trailing\n",
+    "{i}@some_deco\n{i}# TODO: RUSTPYTHON\n{i}@unittest.expectedFailure\n",
+]
+
+
+def _sprinkle(source: str, seed: int) -> str:
+    """Add markers and stray comments to a test file."""
+    rnd = random.Random(seed)
+    lines = []
+    for line in source.split("\n"):
+        stripped = line.lstrip()
+        indent = line[: len(line) - len(stripped)]
+        if stripped.startswith("def test_") and rnd.random() < 0.3:
+            line = _forms[rnd.randrange(len(_forms))].format(i=indent) + line
+        elif stripped.startswith("self.assert") and rnd.random() < 0.05:
+            line += "  # TODO: RUSTPYTHON"
+        elif stripped.startswith("self.") and rnd.random() < 0.05:
+            line = f"{indent}# rustpython\n{line}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _collect(collector: DecoCollector, source: str):
+    with redirect_stderr(StringIO()):
+        collector.collect(source)
+    return compact(collector.func_decos, collector.cls_decos), collector.warnings
+
+
+def _check(source: str) -> ScanCollector:
+    scan = ScanCollector("test")
+    try:
+        expected = _collect(DecoCollector("test"), source)
+    except ParserSyntaxError:
+        # libcst can't parse some valid files (e.g. test_grammar), scan may.
+        with suppress(ParserSyntaxError):
+            _collect(scan, source)
+        return scan
+    except Exception as e:
+        # DecoCollector chokes on some arguments, we should fall back and do the same.
+        with pytest.raises(type(e)):
+            _collect(scan, source)
+        return scan
+    assert _collect(scan, source) == expected
+    return scan
+
+
+def test_annotation_cases():
+    for cases_ in (func_cases, cls_cases):
+        for (_, rust_case, _) in cases_:
+            assert _check(rust_case).fallback is None
+
+
+def test_cases():
+    for source, fallback in cases:
+        scan = _check(source)
+        assert (scan.fallback is not None) == fallback, scan.fallback
+
+
+def _corpus():
+    if CORPUS:
+        return sorted(Path(CORPUS).glob("test_*.py"))
+    return [STDLIB_TEST / name for name in SAMPLE if (STDLIB_TEST / name).exists()]
+
+
+@pytest.mark.parametrize("path", _corpus(), ids=lambda path: path.name)
+def test_corpus(path):
+    # decoded as python would, test_source_encoding isn't utf-8.
+    with tokenize.open(path) as f:
+        source = _sprinkle(f.read(), seed=len(path.name))
+    _check(source)
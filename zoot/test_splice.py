@@ -0,0 +1,135 @@
+# The splice annotator should produce the same output as DecoAnnotator, for source
+# libcst parses and regenerates unchanged.
+import tokenize
+from contextlib import redirect_stderr
+from io import StringIO
+
+import libcst
+import pytest
+from libcst import ParserSyntaxError
+
+from zoot.annotate import DecoCollector, DecoAnnotator
+from zoot.splice import SpliceAnnotator
+from zoot.test_annotate import func_cases, cls_cases
+from zoot.test_scan import _corpus, _sprinkle
+
+# [cpython source, rustpython source]
+cases = [
+    # nested classes, async functions and a class without bases after one with.
+    [
+        """
+import x
+class A(B):
+    class C:
+        async def f(self):
+            pass
+    def g(self): pass
+class D:
+    def g(self): pass
+""",
+        """
+import x
+# TODO: RUSTPYTHON
+@unittest.skip("TODO: RUSTPYTHON")
+class A(B):
+    class C:
+        @unittest.skip(
+            "TODO: RUSTPYTHON",
+        )
+        async def f(self):
+            pass
+    # TODO: RUSTPYTHON
+    @unittest.expectedFailure
+    def g(self): pass
+""",
+    ],
+    # at the top of the module, no trailing newline.
+    [
+        """@decorator
+class A(B):
+    pass""",
+        """import x
+@unittest.skip("TODO: RUSTPYTHON")
+class A(B):
+    pass""",
+    ],
+    # blocks
+    [
+        """
+if x:
+    class A(B):
+        try:
+            pass
+        except Exception:
+            def f(self): pass
+        else:
+            pass
+""",
+        """
+class A(B):
+    # TODO: RUSTPYTHON
+    @unittest.expectedFailure
+    def f(self): pass
+""",
+    ],
+]
+
+
+def _collector(rustpython: str) -> DecoCollector:
+    c = DecoCollector()
+    with redirect_stderr(StringIO()):
+        c.collect(rustpython)
+    return c
+
+
+def _check(cpython: str, rustpython: str) -> SpliceAnnotator:
+    return _compare(cpython, _collector(rustpython))
+
+
+def _compare(cpython: str, c: DecoCollector) -> SpliceAnnotator:
+    expected = libcst.parse_module(cpython).visit(DecoAnnotator.from_collector(c))
+    splice = SpliceAnnotator.from_collector(c)
+    assert splice.annotate(cpython) == expected.code
+    return splice
+
+
+def test_annotation_cases():
+    for cases_ in (func_cases, cls_cases):
+        for (py_case, rust_case, _) in cases_:
+            assert _check(py_case, rust_case).fallback is None
+
+
+def test_cases():
+    for cpython, rustpython in cases:
+        assert _check(cpython, rustpython).fallback is None
+
+
+def test_fallback():
+    c = DecoCollector()
+    c.collect(func_cases[0][1])
+    splice = SpliceAnnotator.from_collector(c)
+    # carriage returns are left to libcst.
+    cpython = func_cases[0][0].replace("\n", "\r\n")
+    assert splice.annotate(cpython) == func_cases[0][2].replace("\n", "\r\n")
+    assert splice.fallback is not None
+
+
+@pytest.mark.parametrize("path", _corpus(), ids=lambda path: path.name)
+def test_corpus(path):
+    # decoded as python would, test_source_encoding isn't utf-8.
+    with tokenize.open(path) as f:
+        cpython = f.read()
+    try:
+        code = libcst.parse_module(cpython).code
+    except ParserSyntaxError:
+        pytest.skip("libcst can't parse it (e.g. test_grammar)")
+    if code != cpython:
+        # libcst 1.0 regenerates `case [0, *x]:` or `except E :` differently, the
+        # output of DecoAnnotator differs from the source outside of annotations.
+        pytest.skip("libcst doesn't round trip it")
+    try:
+        c = _collector(_sprinkle(cpython, seed=len(path.name)))
+    except Exception:
+        # DecoCollector chokes on some arguments (e.g. concatenated strings).
+        pytest.skip("DecoCollector can't collect it")
+    _compare(cpython, c)
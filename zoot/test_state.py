@@ -0,0 +1,34 @@
+from zoot.state import SyncState
+from zoot.test_helpers import _git, _repo
+
+
+def test_roundtrip(tmp_path):
+    state = SyncState.load(tmp_path / "state.json")
+    assert state.synced == {}
+    state.record("test/test_a.py", "abc")
+    state.save()
+    assert SyncState.load(tmp_path / "state.json").synced == {"test/test_a.py": "abc"}
+
+
+def test_changed(tmp_path):
+    cpython = tmp_path / "cpython"
+    cpython.mkdir()
+    test = _repo(cpython)
+    (test / "test_b.py").write_text("b = 1\n")
+    _git(cpython, "add", "-A")
+    _git(cpython, "commit", "-q", "-m", "add b")
+    old = _git(cpython, "rev-parse", "HEAD")
+    (test / "test_b.py").write_text("b = 2\n")
+    _git(cpython, "commit", "-q", "-a", "-m", "change b")
+    new = _git(cpython, "rev-parse", "HEAD")
+
+    state = SyncState(tmp_path / "state.json")
+    state.record("test/test_a.py", old)
+    state.record("test/test_b.py", old)
+    names = ["test/test_a.py", "test/test_b.py", "test/test_c.py"]
+    # never synced files are always changed.
+    assert state.changed(cpython, names, new) == {"test/test_b.py", "test/test_c.py"}
+    assert state.changed(cpython, names[:2], old) == set()
+    # an unknown commit syncs everything.
+    state.record("test/test_a.py", "0" * 40)
+    assert state.changed(cpython, names[:1], new) == {"test/test_a.py"}